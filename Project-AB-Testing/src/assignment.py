@@ -0,0 +1,147 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+# 流量按哈希值划分为 BUCKETS 个桶，分流比例的精度为 0.01%
+BUCKETS = 10000
+
+_MASK = (1 << 64) - 1
+_GAMMA = 0x9E3779B97F4A7C15
+_MIX1 = 0xBF58476D1CE4E5B9
+_MIX2 = 0x94D049BB133111EB
+
+def _salt(experiment_id):
+    """实验ID对应的64位盐值"""
+    digest = hashlib.blake2b(str(experiment_id).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+def _string_key(user_id):
+    """字符串用户ID先映射为64位整数"""
+    return int.from_bytes(hashlib.blake2b(user_id.encode('utf-8'), digest_size=8).digest(), 'little')
+
+def _mix(x):
+    """splitmix64 终结函数（Python整数版本）"""
+    x = (x + _GAMMA) & _MASK
+    x = ((x ^ (x >> 30)) * _MIX1) & _MASK
+    x = ((x ^ (x >> 27)) * _MIX2) & _MASK
+    return x ^ (x >> 31)
+
+def _mix_array(x):
+    """splitmix64 终结函数（numpy uint64 数组版本，乘法按64位自然溢出）"""
+    x = x + np.uint64(_GAMMA)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(_MIX1)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(_MIX2)
+    return x ^ (x >> np.uint64(31))
+
+def _key(user_id):
+    """单个用户ID的64位键: 字符串先做哈希，其余按整数（64位补码）解释"""
+    return _string_key(user_id) if isinstance(user_id, str) else int(user_id) & _MASK
+
+def _keys(user_ids):
+    """
+    把用户ID数组转换为 uint64 键，规则与单用户的 _key 相同
+
+    整数、整数值的浮点数（含缺失值的 Int64 列转换为 numpy 时得到浮点数组）和
+    object 数组中的整数都按整数处理，不会因为数组类型不同而得到不同的分组。
+    """
+    user_ids = np.asarray(user_ids)
+    if np.issubdtype(user_ids.dtype, np.integer):
+        return user_ids.astype(np.int64).view(np.uint64)
+
+    kind = pd.api.types.infer_dtype(user_ids, skipna=False)
+    if kind in ('integer', 'floating', 'mixed-integer-float'):
+        if pd.isna(user_ids).any():
+            raise ValueError("用户ID不能为空")
+        return user_ids.astype(np.int64).view(np.uint64)
+    return np.fromiter((_key(u) for u in user_ids), dtype=np.uint64, count=len(user_ids))
+
+class Experiment:
+    """
+    无状态的确定性分流
+
+    (实验ID, 用户ID) 经哈希映射到 [0, BUCKETS) 中的一个桶，再按分流比例映射到实验组。
+    同一用户在同一实验中总是落在同一组，不同实验之间的分组相互独立；
+    数据生成、分析和线上服务只要使用相同的实验配置就能得到一致的分组，无需保存分组表。
+
+    参数:
+    experiment_id: 实验ID
+    variants: 实验组名列表
+    weights: 各组流量比例（会被归一化），默认均分
+    """
+
+    def __init__(self, experiment_id, variants=('control', 'treatment'), weights=None):
+        if weights is None:
+            weights = [1] * len(variants)
+        if len(weights) != len(variants):
+            raise ValueError("weights 与 variants 的长度不一致")
+        weights = np.asarray(weights, dtype=np.float64)
+        if np.any(weights < 0) or weights.sum() <= 0:
+            raise ValueError("流量比例必须为非负数且不能全为0")
+
+        self.experiment_id = experiment_id
+        self.variants = list(variants)
+        self.weights = weights / weights.sum()
+        self.dtype = pd.CategoricalDtype(self.variants)
+        self._salt = _salt(experiment_id)
+        # 各组的桶区间上界
+        self._bounds = np.round(np.cumsum(self.weights) * BUCKETS).astype(np.int64)
+        self._bounds[-1] = BUCKETS
+        self._bound_list = self._bounds.tolist()
+
+    def bucket(self, user_id):
+        """单个用户所在的桶"""
+        return _mix(_key(user_id) ^ self._salt) % BUCKETS
+
+    def assign(self, user_id):
+        """单个用户的分组（在线服务使用，每次调用约1微秒）"""
+        bucket = self.bucket(user_id)
+        for variant, bound in zip(self.variants, self._bound_list):
+            if bucket < bound:
+                return variant
+
+    def buckets(self, user_ids):
+        """批量计算用户所在的桶"""
+        return (_mix_array(_keys(user_ids) ^ np.uint64(self._salt)) % np.uint64(BUCKETS)).astype(np.int64)
+
+    def assign_codes(self, user_ids):
+        """批量分组，返回实验组在 variants 中的下标"""
+        return np.searchsorted(self._bounds, self.buckets(user_ids), side='right').astype(np.int8)
+
+    def assign_many(self, user_ids):
+        """批量分组，返回 Categorical"""
+        return pd.Categorical.from_codes(self.assign_codes(user_ids), dtype=self.dtype)
+
+    def to_dict(self):
+        """可JSON序列化的实验配置"""
+        return {'experiment_id': self.experiment_id, 'variants': self.variants, 'weights': self.weights.tolist()}
+
+    @classmethod
+    def from_dict(cls, config):
+        return cls(config['experiment_id'], config['variants'], config.get('weights'))
+
+def assignment_mismatches(df, experiment):
+    """
+    检查数据中的分组是否与分流配置一致
+
+    返回:
+    分组与哈希分流结果不一致的行数
+    """
+    expected = experiment.assign_many(df['user_id'].to_numpy())
+    return int(np.count_nonzero(df['group'].astype(str).to_numpy() != np.asarray(expected).astype(str)))
+
+if __name__ == "__main__":
+    import time
+
+    experiment = Experiment('start_button_color')
+    user_ids = np.arange(10000000)
+
+    start = time.perf_counter()
+    codes = experiment.assign_codes(user_ids)
+    elapsed = time.perf_counter() - start
+    print(f"批量分流 {len(user_ids):,} 个用户: {elapsed:.3f}s，各组比例 {np.bincount(codes) / len(codes)}")
+
+    start = time.perf_counter()
+    for user_id in range(100000):
+        experiment.assign(user_id)
+    print(f"单用户分流: {(time.perf_counter() - start) / 100000 * 1e6:.2f} 微秒/次")
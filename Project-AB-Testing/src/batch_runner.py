@@ -0,0 +1,140 @@
+import argparse
+import json
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from statistical_analysis import load_data, aggregate_counts, analyze_counts, save_statistical_results
+from storage import read_columns
+from main import generate_report
+
+def load_manifest(manifest_path):
+    """
+    读取实验清单（JSON列表），每个实验包含:
+    id: 实验ID（用作输出目录名）
+    data: 数据文件路径（.csv / .parquet / .feather），相对路径以清单所在目录为基准
+    metric: 0/1 指标列名，默认 'clicked'
+    alpha: 显著性水平，默认 0.05
+    ci_method: 置信区间方法，默认 'wald'
+    seed: 功效模拟的随机种子，默认 42
+    """
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        experiments = json.load(f)
+
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    for experiment in experiments:
+        experiment['data'] = os.path.join(base_dir, experiment['data'])
+        experiment.setdefault('metric', 'clicked')
+        experiment.setdefault('alpha', 0.05)
+        experiment.setdefault('ci_method', 'wald')
+        experiment.setdefault('seed', 42)
+
+    return experiments
+
+def run_experiment(counts, experiment, output_dir):
+    """分析单个实验并写出结果文件和报告，返回汇总信息"""
+    np.random.seed(experiment['seed'])
+    results = analyze_counts(counts, ci_method=experiment['ci_method'], alpha=experiment['alpha'])
+
+    experiment_dir = os.path.join(output_dir, experiment['id'])
+    os.makedirs(experiment_dir, exist_ok=True)
+    results_path = os.path.join(experiment_dir, 'statistical_results.json')
+    save_statistical_results(results, results_path)
+
+    with open(os.path.join(experiment_dir, 'ab_test_report.md'), 'w', encoding='utf-8') as f:
+        f.write(generate_report(results))
+
+    return {
+        'id': experiment['id'],
+        'data': experiment['data'],
+        'metric': experiment['metric'],
+        'alpha': experiment['alpha'],
+        'difference': results['confidence_intervals']['difference'],
+        'p_value': results['chi_square_test']['p_value'],
+        'significant': bool(results['chi_square_test']['p_value'] < experiment['alpha']),
+        'power': results['power_analysis']['power'],
+        'results_path': results_path
+    }
+
+def count_data_source(data_path, metrics):
+    """
+    加载同一数据源并计算各指标的分组计数
+
+    数据只加载一次（只读取用到的列）；数据中不存在的指标不出现在结果中。
+    """
+    available = set(read_columns(data_path))
+    metrics = sorted(set(metrics) & available)
+    df = load_data(data_path, columns=['group'] + metrics)
+    return {metric: aggregate_counts(df, metric) for metric in metrics}
+
+def run_batch(experiments, output_dir, n_jobs=None):
+    """
+    并行运行一批实验，并写出汇总索引 index.json
+
+    参数:
+    experiments: load_manifest 的结果
+    output_dir: 输出目录，每个实验一个子目录
+    n_jobs: 进程数，默认使用全部CPU核
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    # 按数据源分组，共享数据加载和计数
+    by_source = defaultdict(list)
+    for experiment in experiments:
+        by_source[experiment['data']].append(experiment)
+
+    def failure(experiment, error):
+        return {'id': experiment['id'], 'data': experiment['data'], 'error': str(error)}
+
+    summaries = []
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        # 每个数据源只计数一次，计数完成后每个实验单独提交，同一数据源上的实验也能并行
+        count_futures = {
+            executor.submit(count_data_source, data_path,
+                            {experiment['metric'] for experiment in source_experiments}): source_experiments
+            for data_path, source_experiments in by_source.items()
+        }
+        experiment_futures = {}
+        for future in as_completed(count_futures):
+            source_experiments = count_futures[future]
+            try:
+                counts_by_metric = future.result()
+            except Exception as e:
+                summaries.extend(failure(experiment, e) for experiment in source_experiments)
+                continue
+            for experiment in source_experiments:
+                if experiment['metric'] not in counts_by_metric:
+                    summaries.append(failure(experiment, f"数据中不存在指标列: {experiment['metric']}"))
+                    continue
+                counts = counts_by_metric[experiment['metric']]
+                experiment_futures[executor.submit(run_experiment, counts, experiment, output_dir)] = experiment
+
+        for future, experiment in experiment_futures.items():
+            try:
+                summaries.append(future.result())
+            except Exception as e:
+                summaries.append(failure(experiment, e))
+
+    # 按清单顺序输出汇总
+    order = {experiment['id']: i for i, experiment in enumerate(experiments)}
+    summaries.sort(key=lambda summary: order[summary['id']])
+
+    with open(os.path.join(output_dir, 'index.json'), 'w', encoding='utf-8') as f:
+        json.dump(summaries, f, indent=2, ensure_ascii=False)
+
+    return summaries
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='批量运行A/B测试分析')
+    parser.add_argument('manifest', help='实验清单JSON文件')
+    parser.add_argument('--output-dir', default='../results/batch', help='输出目录')
+    parser.add_argument('--jobs', type=int, default=None, help='并行进程数')
+    args = parser.parse_args()
+
+    summaries = run_batch(load_manifest(args.manifest), args.output_dir, args.jobs)
+
+    failed = [summary for summary in summaries if 'error' in summary]
+    print(f"批量分析完成: {len(summaries) - len(failed)} 个成功, {len(failed)} 个失败")
+    print(f"汇总索引已保存至: {os.path.join(args.output_dir, 'index.json')}")
@@ -0,0 +1,189 @@
+import numpy as np
+from scipy import stats
+from scipy.special import roots_legendre
+
+# 高斯-勒让德积分节点（在 [-1, 1] 上）
+_NODES, _WEIGHTS = roots_legendre(256)
+
+# 组数超过该值时，"每组为最优的概率"改用后验抽样（积分开销随组数平方增长）
+QUADRATURE_MAX_GROUPS = 32
+
+def posterior_params(counts, prior=(1.0, 1.0)):
+    """
+    各组Beta后验分布参数
+
+    参数:
+    counts: aggregate_counts 的结果（可以包含任意多个实验组）
+    prior: Beta先验 (alpha, beta)，默认均匀先验
+
+    返回:
+    (组名列表, alpha数组, beta数组)
+    """
+    clicks = counts['clicks'].to_numpy(dtype=np.float64)
+    totals = counts['count'].to_numpy(dtype=np.float64)
+    return list(counts.index), prior[0] + clicks, prior[1] + totals - clicks
+
+def _nodes_over(a, b):
+    """Beta(a, b) 主要质量区间上的积分节点和权重（a, b 可以是数组，节点沿最后一维）"""
+    a = np.asarray(a, dtype=np.float64)[..., None]
+    b = np.asarray(b, dtype=np.float64)[..., None]
+    low = stats.beta.ppf(1e-12, a, b)
+    high = stats.beta.ppf(1 - 1e-12, a, b)
+    x = (high - low) / 2 * _NODES + (high + low) / 2
+    return x, (high - low) / 2 * _WEIGHTS
+
+def _integrate_over(a, b, integrand):
+    """在 Beta(a, b) 的主要质量区间上做高斯-勒让德积分"""
+    x, w = _nodes_over(a, b)
+    return np.sum(w * integrand(x), axis=-1)
+
+def _column(*arrays):
+    """把参数转换为可与积分节点（最后一维）广播的数组"""
+    return [np.asarray(a, dtype=np.float64)[..., None] for a in arrays]
+
+def prob_b_beats_a(a_alpha, a_beta, b_alpha, b_beta):
+    """
+    P(B > A) = ∫ f_B(x) F_A(x) dx
+
+    数值积分结果精确到约1e-10；参数可以是数组，一次比较多组。
+    """
+    aa, ab, ba, bb = _column(a_alpha, a_beta, b_alpha, b_beta)
+    return _integrate_over(b_alpha, b_beta, lambda x: stats.beta.pdf(x, ba, bb) * stats.beta.cdf(x, aa, ab))
+
+def expected_loss(a_alpha, a_beta, b_alpha, b_beta):
+    """
+    选择B而A实际更好时的期望损失 E[max(A - B, 0)]
+
+    利用Beta分布的部分期望 E[A·1{A>y}] = E[A]·(1 - F_{a+1,b}(y))，只需一维积分；参数可以是数组。
+    """
+    aa, ab, ba, bb = _column(a_alpha, a_beta, b_alpha, b_beta)
+    mean_a = aa / (aa + ab)
+
+    def integrand(y):
+        upper_tail = mean_a * stats.beta.sf(y, aa + 1, ab) - y * stats.beta.sf(y, aa, ab)
+        return stats.beta.pdf(y, ba, bb) * upper_tail
+
+    return np.maximum(_integrate_over(b_alpha, b_beta, integrand), 0.0)
+
+def best_variant_quadrature(alphas, betas):
+    """
+    用数值积分计算每组为最优的概率和期望损失
+
+    P(j最优) = ∫ f_j(x) Π_{i≠j} F_i(x) dx，E[max] = Σ_j ∫ x f_j(x) Π_{i≠j} F_i(x) dx，
+    期望损失 = E[max] - E[θ_j]。每个积分都在第 j 组后验的质量区间上进行，
+    全部组一次向量化计算，复杂度为 O(组数² x 节点数)。
+    """
+    alphas = np.asarray(alphas, dtype=np.float64)
+    betas = np.asarray(betas, dtype=np.float64)
+    k = len(alphas)
+
+    x, w = _nodes_over(alphas, betas)                                     # (k, nodes)
+    density = stats.beta.pdf(x, alphas[:, None], betas[:, None])
+    # cdfs[j, i] = F_i 在第 j 组节点上的取值
+    cdfs = stats.beta.cdf(x[:, None, :], alphas[None, :, None], betas[None, :, None])
+    cdfs[np.arange(k), np.arange(k)] = 1.0
+    others = np.prod(cdfs, axis=1)
+
+    prob_best = np.sum(w * density * others, axis=1)
+    expected_max = np.sum(w * x * density * others)
+    loss = np.maximum(expected_max - alphas / (alphas + betas), 0.0)
+    return prob_best, loss
+
+def sample_posteriors(alphas, betas, n_draws=1000000, seed=42, chunk_size=200000):
+    """
+    对多个实验组批量做后验抽样，计算每组为最优的概率和期望损失
+
+    分块抽样，内存只与 chunk_size 和组数有关。
+
+    返回:
+    (各组为最优的概率数组, 各组期望损失数组)
+    """
+    rng = np.random.default_rng(seed)
+    k = len(alphas)
+    best_counts = np.zeros(k, dtype=np.int64)
+    loss_sums = np.zeros(k)
+
+    for start in range(0, n_draws, chunk_size):
+        size = min(chunk_size, n_draws - start)
+        draws = rng.beta(alphas, betas, size=(size, k))
+        best = draws.max(axis=1)
+        best_counts += np.bincount(draws.argmax(axis=1), minlength=k)
+        loss_sums += (best[:, None] - draws).sum(axis=0)
+
+    return best_counts / n_draws, loss_sums / n_draws
+
+def bayesian_analysis(counts, control='control', prior=(1.0, 1.0), method='auto', n_draws=1000000,
+                      credible_level=0.95, seed=42):
+    """
+    基于各组计数的Beta-Binomial贝叶斯分析
+
+    各实验组与对照组的比较使用数值积分得到精确的 P(实验组 > 对照组) 和期望损失；
+    每组为最优的概率和期望损失在组数不多时同样用数值积分，组数很多时改为批量后验抽样。
+
+    参数:
+    counts: aggregate_counts 的结果（可以包含任意多个实验组）
+    control: 对照组名
+    prior: Beta先验 (alpha, beta)
+    method: 'quadrature'、'sampling' 或 'auto'（组数不超过 QUADRATURE_MAX_GROUPS 时用积分）
+    n_draws: 后验抽样次数（仅抽样时使用）
+    credible_level: 可信区间水平
+    """
+    groups, alphas, betas = posterior_params(counts, prior)
+    tail = (1 - credible_level) / 2
+    lower = stats.beta.ppf(tail, alphas, betas)
+    upper = stats.beta.ppf(1 - tail, alphas, betas)
+
+    posteriors = {
+        group: {
+            'alpha': float(alphas[i]),
+            'beta': float(betas[i]),
+            'mean': float(alphas[i] / (alphas[i] + betas[i])),
+            'credible_interval': [float(lower[i]), float(upper[i])]
+        }
+        for i, group in enumerate(groups)
+    }
+
+    # 各实验组与对照组的比较（一次向量化积分）
+    c = groups.index(control)
+    variants = [i for i in range(len(groups)) if i != c]
+    a, b = alphas[variants], betas[variants]
+    prob_beats = prob_b_beats_a(alphas[c], betas[c], a, b)
+    loss_choose = expected_loss(alphas[c], betas[c], a, b)
+    loss_keep = expected_loss(a, b, alphas[c], betas[c])
+    comparisons = {
+        groups[i]: {
+            'prob_beats_control': float(prob_beats[j]),
+            'expected_loss_choose_variant': float(loss_choose[j]),
+            'expected_loss_keep_control': float(loss_keep[j])
+        }
+        for j, i in enumerate(variants)
+    }
+
+    if method == 'auto':
+        method = 'quadrature' if len(groups) <= QUADRATURE_MAX_GROUPS else 'sampling'
+    if method == 'quadrature':
+        prob_best, loss = best_variant_quadrature(alphas, betas)
+    elif method == 'sampling':
+        prob_best, loss = sample_posteriors(alphas, betas, n_draws, seed)
+    else:
+        raise ValueError(f"未知的计算方法: {method}")
+
+    results = {
+        'prior': list(prior),
+        'credible_level': credible_level,
+        'method': method,
+        'posteriors': posteriors,
+        'comparisons': comparisons,
+        'prob_best': dict(zip(groups, prob_best.tolist())),
+        'expected_loss': dict(zip(groups, loss.tolist()))
+    }
+    if method == 'sampling':
+        results['n_draws'] = n_draws
+
+    # 常见的两组实验直接给出实验组的结果
+    if 'treatment' in comparisons:
+        results['prob_treatment_beats_control'] = comparisons['treatment']['prob_beats_control']
+        results['expected_loss_treatment'] = comparisons['treatment']['expected_loss_choose_variant']
+        results['expected_loss_control'] = comparisons['treatment']['expected_loss_keep_control']
+
+    return results
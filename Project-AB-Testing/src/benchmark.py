@@ -0,0 +1,223 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import queue as queue_module
+import resource
+import sys
+import tempfile
+import time
+import traceback
+
+DEFAULT_ROWS = [10000, 100000, 1000000, 10000000]
+DEFAULT_SIMULATIONS = [1000, 10000, 100000, 1000000]
+STAGES = ['generate_ab_test_data', 'save_data', 'load_data', 'chi_square_test',
+          'comprehensive_analysis', 'manual_power_analysis']
+
+def _max_rss_mb():
+    """当前进程的峰值常驻内存 (MB)"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以KB为单位，macOS 以字节为单位
+    return rss / 1024 / 1024 if sys.platform == 'darwin' else rss / 1024
+
+def _run_case(stage, size, file_format, queue):
+    """
+    在独立子进程中准备输入并测量单个阶段，避免各阶段的内存峰值互相影响
+
+    rss_delta_mb 为阶段执行期间峰值内存的增量，不包含准备输入数据的部分。
+    阶段抛出异常时把错误信息放入队列，由父进程记录为失败。
+    """
+    try:
+        queue.put(_measure_case(stage, size, file_format))
+    except Exception as exc:
+        queue.put({'stage': stage, 'size': size, 'error': f'{type(exc).__name__}: {exc}',
+                   'traceback': traceback.format_exc()})
+
+def _measure_case(stage, size, file_format):
+    """准备输入并测量单个阶段，返回测量结果"""
+    import numpy as np
+    from data_generator import generate_ab_test_data, save_data
+    from statistical_analysis import (load_data, chi_square_test, comprehensive_analysis,
+                                      manual_power_analysis)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        raw_path = os.path.join(tmp_dir, f'raw.{file_format}')
+        processed_path = os.path.join(tmp_dir, f'processed.{file_format}')
+
+        # 准备输入
+        if stage == 'generate_ab_test_data':
+            run = lambda: generate_ab_test_data(n_users=size)
+        elif stage == 'manual_power_analysis':
+            np.random.seed(42)
+            run = lambda: manual_power_analysis(0.08, 0.105, 5000, n_simulations=size)
+        else:
+            df = generate_ab_test_data(n_users=size)
+            if stage == 'save_data':
+                run = lambda: save_data(df, raw_path, processed_path)
+            elif stage == 'load_data':
+                save_data(df, raw_path, processed_path)
+                del df
+                run = lambda: load_data(processed_path, columns=['group', 'clicked'])
+            elif stage == 'chi_square_test':
+                run = lambda: chi_square_test(df)
+            else:
+                np.random.seed(42)
+                run = lambda: comprehensive_analysis(df)
+
+        rss_before = _max_rss_mb()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        run()
+        cpu_seconds = time.process_time() - cpu_start
+        wall_seconds = time.perf_counter() - wall_start
+        peak_rss = _max_rss_mb()
+
+    return {
+        'stage': stage,
+        'size': size,
+        'unit': 'simulations' if stage == 'manual_power_analysis' else 'rows',
+        'wall_seconds': wall_seconds,
+        'cpu_seconds': cpu_seconds,
+        'peak_rss_mb': round(peak_rss, 1),
+        'rss_delta_mb': round(max(0.0, peak_rss - rss_before), 1),
+        'throughput_per_second': size / wall_seconds if wall_seconds > 0 else None
+    }
+
+def _wait_for_result(process, queue, stage, size, timeout=None, poll_interval=1.0):
+    """
+    等待子进程的测量结果
+
+    子进程异常退出（未捕获的错误、被OOM终止等）或超时时返回带 error 字段的结果，而不是一直阻塞。
+    """
+    deadline = time.monotonic() + timeout if timeout else None
+    while True:
+        try:
+            return queue.get(timeout=poll_interval)
+        except queue_module.Empty:
+            pass
+        if not process.is_alive():
+            # 进程可能在最后一次轮询之后才放入结果
+            try:
+                return queue.get(timeout=poll_interval)
+            except queue_module.Empty:
+                return {'stage': stage, 'size': size, 'error': f'子进程异常退出 (exitcode={process.exitcode})'}
+        if deadline is not None and time.monotonic() > deadline:
+            process.terminate()
+            return {'stage': stage, 'size': size, 'error': f'超过 {timeout}s 未完成'}
+
+def run_benchmarks(stages=None, rows=None, simulations=None, file_format='csv', repeat=1, timeout=None):
+    """
+    运行基准测试，每个 (阶段, 规模) 在独立子进程中执行 repeat 次，取最快的一次
+
+    参数:
+    timeout: 单次测量的超时秒数，默认不限制
+
+    返回:
+    包含环境信息、各测量结果和失败项（failures）的字典
+    """
+    stages = stages or STAGES
+    rows = rows or DEFAULT_ROWS
+    simulations = simulations or DEFAULT_SIMULATIONS
+    context = multiprocessing.get_context('spawn')
+
+    results = []
+    failures = []
+    for stage in stages:
+        sizes = simulations if stage == 'manual_power_analysis' else rows
+        for size in sizes:
+            runs = []
+            for _ in range(repeat):
+                queue = context.Queue()
+                process = context.Process(target=_run_case, args=(stage, size, file_format, queue))
+                process.start()
+                runs.append(_wait_for_result(process, queue, stage, size, timeout))
+                process.join()
+            failed = [r for r in runs if 'error' in r]
+            if failed:
+                failures.append(failed[0])
+                print(f"{stage:<24} {size:>10,}  失败: {failed[0]['error']}")
+                continue
+            best = min(runs, key=lambda r: r['wall_seconds'])
+            results.append(best)
+            print(f"{stage:<24} {size:>10,}  {best['wall_seconds']:9.3f}s  "
+                  f"峰值内存 {best['peak_rss_mb']:8.1f}MB (+{best['rss_delta_mb']:.1f}MB)")
+
+    return {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'file_format': file_format,
+        'results': results,
+        'failures': failures
+    }
+
+def compare_to_baseline(report, baseline, tolerance=0.25, min_delta=0.01):
+    """
+    与基线结果比较，耗时超过基线 (1 + tolerance) 倍的测量视为性能回退
+
+    绝对增量小于 min_delta 秒的测量不计为回退，避免毫秒级阶段的计时噪声误报。
+
+    返回:
+    回退项列表
+    """
+    baseline_times = {(r['stage'], r['size']): r['wall_seconds'] for r in baseline['results']}
+    regressions = []
+    for result in report['results']:
+        key = (result['stage'], result['size'])
+        if key not in baseline_times or baseline_times[key] <= 0:
+            continue
+        ratio = result['wall_seconds'] / baseline_times[key]
+        result['baseline_ratio'] = round(ratio, 3)
+        if ratio > 1 + tolerance and result['wall_seconds'] - baseline_times[key] > min_delta:
+            regressions.append({
+                'stage': result['stage'],
+                'size': result['size'],
+                'baseline_seconds': baseline_times[key],
+                'wall_seconds': result['wall_seconds'],
+                'ratio': round(ratio, 3)
+            })
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='A/B测试流程各阶段的规模基准测试')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, help='要测试的阶段')
+    parser.add_argument('--rows', nargs='+', type=int, help='数据规模（行数）')
+    parser.add_argument('--simulations', nargs='+', type=int, help='功效分析的模拟次数')
+    parser.add_argument('--format', default='csv', choices=['csv', 'parquet', 'feather'], help='数据文件格式')
+    parser.add_argument('--repeat', type=int, default=1, help='每项重复次数（取最快一次）')
+    parser.add_argument('--output', default='../results/benchmarks/latest.json', help='结果输出路径')
+    parser.add_argument('--baseline', default='../results/benchmarks/baseline.json', help='基线结果路径')
+    parser.add_argument('--save-baseline', action='store_true', help='将本次结果保存为新基线')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='允许的耗时增幅')
+    parser.add_argument('--timeout', type=float, help='单次测量的超时秒数')
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.stages, args.rows, args.simulations, args.format, args.repeat, args.timeout)
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare_to_baseline(report, json.load(f), args.tolerance)
+        report['regressions'] = regressions
+
+    output_path = args.baseline if args.save_baseline else args.output
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\n基准测试结果已保存至: {output_path}")
+
+    if report['failures']:
+        print("\n❌ 以下测量失败:")
+        for item in report['failures']:
+            print(f"  {item['stage']} ({item['size']:,}): {item['error']}")
+    
+    if regressions:
+        print("\n⚠️ 发现性能回退:")
+        for item in regressions:
+            print(f"  {item['stage']} ({item['size']:,}): {item['baseline_seconds']:.3f}s -> "
+                  f"{item['wall_seconds']:.3f}s (x{item['ratio']})")
+    
+    if report['failures'] or regressions:
+        sys.exit(1)
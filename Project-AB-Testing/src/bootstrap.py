@@ -0,0 +1,115 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+def bucket_counts(df, n_buckets=100):
+    """
+    将明细数据按行号分桶，汇总为每组每桶的样本量和点击数
+
+    返回:
+    {group: (各桶样本量数组, 各桶点击数数组)}
+    """
+    buckets = np.arange(len(df)) % n_buckets
+    grouped = df.groupby([df['group'], buckets], observed=True)['clicked'].agg(['count', 'sum'])
+
+    return {
+        group: (frame['count'].to_numpy(), frame['sum'].to_numpy())
+        for group, frame in grouped.groupby(level=0)
+    }
+
+def buckets_from_counts(counts):
+    """
+    将 aggregate_counts 的结果转换为每组一个桶的形式
+
+    只能用于 level='row' 的重抽样；按桶重抽样需要 bucket_counts 得到的真实分桶数据。
+    """
+    return {
+        group: (np.array([row['count']]), np.array([row['clicks']]))
+        for group, row in counts.iterrows()
+    }
+
+def _resample_ctr(rng, totals, clicks, n_replicates, level):
+    """对一组数据生成 n_replicates 个Poisson重抽样点击率"""
+    totals = np.asarray(totals, dtype=np.float64)
+    clicks = np.asarray(clicks, dtype=np.float64)
+
+    if level == 'row':
+        # 每行Poisson(1)权重之和仍服从Poisson分布，可直接由桶内计数抽样
+        resampled_clicks = rng.poisson(clicks, size=(n_replicates, len(clicks))).sum(axis=1)
+        resampled_misses = rng.poisson(totals - clicks, size=(n_replicates, len(clicks))).sum(axis=1)
+        resampled_totals = resampled_clicks + resampled_misses
+    else:
+        # 每桶一个权重，适用于桶内相关的比率指标
+        weights = rng.poisson(1.0, size=(n_replicates, len(clicks)))
+        resampled_clicks = weights @ clicks
+        resampled_totals = weights @ totals
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return resampled_clicks / resampled_totals
+
+def _bootstrap_batch(control, treatment, n_replicates, seed, level):
+    """生成一批重抽样的点击率差异（可在子进程中执行）"""
+    rng = np.random.default_rng(seed)
+    control_ctr = _resample_ctr(rng, *control, n_replicates, level)
+    treatment_ctr = _resample_ctr(rng, *treatment, n_replicates, level)
+    return treatment_ctr - control_ctr
+
+def poisson_bootstrap(buckets, n_replicates=10000, alpha=0.05, level='row', seed=42,
+                      batch_size=2000, n_jobs=1):
+    """
+    Poisson自助法计算点击率差异的置信区间
+
+    参数:
+    buckets: bucket_counts 或 buckets_from_counts 的结果
+    n_replicates: 重抽样次数
+    alpha: 显著性水平
+    level: 'row' 按行加权（与逐行重抽样等价）；'bucket' 按桶加权（适合聚类或比率指标）
+    seed: 随机种子，每批使用 SeedSequence 派生的独立随机数流，结果与 n_jobs 无关
+    batch_size: 每批重抽样次数，控制内存
+    n_jobs: 并行进程数
+
+    返回:
+    与 calculate_confidence_interval 字段一致的字典，并附带 method 和 n_replicates
+    """
+    if level not in ('row', 'bucket'):
+        raise ValueError(f"未知的重抽样层级: {level}")
+
+    control = buckets['control']
+    treatment = buckets['treatment']
+    # 只有一个桶时每次重抽样的点击率都不变，按桶重抽样得到的区间宽度为0
+    if level == 'bucket' and min(len(control[0]), len(treatment[0])) < 2:
+        raise ValueError("按桶重抽样需要每组至少2个桶，请使用 bucket_counts 的分桶数据")
+
+    batch_sizes = [min(batch_size, n_replicates - start) for start in range(0, n_replicates, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(batch_sizes))
+    args = [(control, treatment, size, child, level) for size, child in zip(batch_sizes, seeds)]
+
+    if n_jobs > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            batches = list(executor.map(_bootstrap_batch, *zip(*args)))
+    else:
+        batches = [_bootstrap_batch(*arg) for arg in args]
+
+    diffs = np.concatenate(batches)
+    diffs = diffs[~np.isnan(diffs)]
+
+    p_a = control[1].sum() / control[0].sum()
+    p_b = treatment[1].sum() / treatment[0].sum()
+    ci_lower, ci_upper = np.quantile(diffs, [alpha / 2, 1 - alpha / 2])
+
+    return {
+        'difference': p_b - p_a,
+        'ci_lower': float(ci_lower),
+        'ci_upper': float(ci_upper),
+        'margin_of_error': float((ci_upper - ci_lower) / 2),
+        'relative_improvement': (p_b - p_a) / p_a,
+        'method': f'poisson_bootstrap_{level}',
+        'n_replicates': int(len(diffs))
+    }
+
+if __name__ == "__main__":
+    df = pd.read_csv('../data/processed/ab_test_clean_data.csv', usecols=['group', 'clicked'])
+
+    result = poisson_bootstrap(bucket_counts(df), n_replicates=20000, n_jobs=2)
+    print(f"Bootstrap 95% 置信区间: [{result['ci_lower']:.4f}, {result['ci_upper']:.4f}]")
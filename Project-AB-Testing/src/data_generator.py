@@ -1,67 +1,136 @@
 import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
+from storage import write_frame, FrameAppender, GROUP_DTYPE, user_id_dtype
 
-def generate_ab_test_data(control_ctr=0.08, treatment_ctr=0.105, n_users=10000):
+START_DATE = np.datetime64('2024-01-01T00:00:00', 'ns')
+
+def _build_frame(user_ids, group_codes, clicks, days, hours, n_users):
+    """
+    由数组组装紧凑结构的A/B测试DataFrame（列类型见 storage.AB_DTYPES）
+    
+    用户ID的类型由总用户数决定，同一数据集的各个分块类型一致。
+    """
+    timestamps = START_DATE + days.astype('timedelta64[D]') + hours.astype('timedelta64[h]')
+    
+    return pd.DataFrame({
+        'user_id': user_ids.astype(user_id_dtype(n_users - 1)),
+        'timestamp': timestamps,
+        'group': pd.Categorical.from_codes(group_codes, dtype=GROUP_DTYPE),
+        'clicked': clicks.astype(np.int8)
+    })
+
+def _check_experiment(experiment):
+    """模拟数据的分组必须是 control / treatment"""
+    if experiment is not None and experiment.variants != list(GROUP_DTYPE.categories):
+        raise ValueError(f"实验组必须为 {list(GROUP_DTYPE.categories)}，实际为 {experiment.variants}")
+
+def generate_ab_test_data(control_ctr=0.08, treatment_ctr=0.105, n_users=10000, experiment=None):
     """
     生成A/B测试模拟数据
     
+    全部使用数组运算生成。抽样顺序与逐用户循环一致（点击数按用户依次抽取，
+    天数和小时交替抽取），因此相同种子下生成的数据与原实现相同。
+    
     参数:
     control_ctr: 控制组点击率 (8%)
     treatment_ctr: 实验组点击率 (10.5%)
     n_users: 总用户数
+    experiment: assignment.Experiment，给出时按哈希分流确定分组（与线上服务一致），
+                否则随机分配
     """
+    _check_experiment(experiment)
     np.random.seed(42)  # 确保结果可重现
     
-    # 生成用户ID
-    user_ids = [f"user_{i:06d}" for i in range(n_users)]
-    
-    # 随机分配到控制组和实验组
-    groups = np.random.choice(['control', 'treatment'], size=n_users, p=[0.5, 0.5])
+    if experiment is not None:
+        group_codes = experiment.assign_codes(np.arange(n_users))
+    else:
+        # 随机分配到控制组(0)和实验组(1)
+        group_codes = np.random.choice(2, size=n_users, p=[0.5, 0.5])
     
     # 根据分组生成点击数据
-    clicks = []
-    for group in groups:
-        if group == 'control':
-            click = np.random.binomial(1, control_ctr)
-        else:
-            click = np.random.binomial(1, treatment_ctr)
-        clicks.append(click)
-    
-    # 生成时间戳（模拟7天数据）
-    start_date = datetime(2024, 1, 1)
-    timestamps = []
-    for i in range(n_users):
-        random_days = np.random.randint(0, 7)
-        random_hours = np.random.randint(0, 24)
-        timestamp = start_date + timedelta(days=random_days, hours=random_hours)
-        timestamps.append(timestamp)
-    
-    # 创建DataFrame
-    df = pd.DataFrame({
-        'user_id': user_ids,
-        'timestamp': timestamps,
-        'group': groups,
-        'clicked': clicks
-    })
+    clicks = np.random.binomial(1, np.where(group_codes == 0, control_ctr, treatment_ctr))
+    
+    # 生成时间戳（模拟7天数据），天数和小时交替抽取
+    offsets = np.random.randint(0, np.tile([7, 24], n_users)).reshape(n_users, 2)
+    
+    return _build_frame(np.arange(n_users), group_codes, clicks, offsets[:, 0], offsets[:, 1], n_users)
+
+def generate_ab_test_data_chunks(control_ctr=0.08, treatment_ctr=0.105, n_users=10000,
+                                 chunk_size=1000000, seed=42, experiment=None):
+    """
+    分块生成A/B测试模拟数据
     
-    return df
+    每个分块使用由 SeedSequence 派生的独立随机数流，结果只取决于 seed 和 chunk_size，
+    与分块的处理顺序无关。内存占用只与 chunk_size 有关。
+    
+    参数:
+    control_ctr: 控制组点击率
+    treatment_ctr: 实验组点击率
+    n_users: 总用户数
+    chunk_size: 每个分块的用户数
+    seed: 随机种子
+    experiment: assignment.Experiment，给出时按哈希分流确定分组
+    """
+    _check_experiment(experiment)
+    n_chunks = (n_users + chunk_size - 1) // chunk_size
+    child_seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+    
+    for i, child_seed in enumerate(child_seeds):
+        rng = np.random.default_rng(child_seed)
+        start = i * chunk_size
+        size = min(chunk_size, n_users - start)
+        
+        user_ids = np.arange(start, start + size)
+        
+        # 使用哈希分流时仍抽取随机分组，保证其余字段的随机数流不变
+        is_treatment = rng.random(size) < 0.5
+        if experiment is not None:
+            is_treatment = experiment.assign_codes(user_ids) == 1
+        clicks = rng.binomial(1, np.where(is_treatment, treatment_ctr, control_ctr))
+        days = rng.integers(0, 7, size=size)
+        hours = rng.integers(0, 24, size=size)
+        
+        yield _build_frame(user_ids, is_treatment.astype(np.int8), clicks, days, hours, n_users)
+
+def add_time_features(df):
+    """添加日期和小时字段"""
+    df_clean = df.copy()
+    timestamps = pd.to_datetime(df_clean['timestamp'])
+    df_clean['date'] = timestamps.dt.normalize()
+    df_clean['hour'] = timestamps.dt.hour.astype(np.int8)
+    return df_clean
 
 def save_data(df, raw_path, processed_path):
-    """保存原始和处理后的数据"""
+    """
+    保存原始和处理后的数据
+    
+    文件格式由扩展名决定（.csv / .parquet / .feather），列式格式保留列类型。
+    """
     # 保存原始数据
-    df.to_csv(raw_path, index=False)
+    write_frame(df, raw_path)
     
     # 数据清洗和处理
-    df_clean = df.copy()
-    df_clean['date'] = pd.to_datetime(df_clean['timestamp']).dt.date
-    df_clean['hour'] = pd.to_datetime(df_clean['timestamp']).dt.hour
+    df_clean = add_time_features(df)
     
     # 保存处理后的数据
-    df_clean.to_csv(processed_path, index=False)
+    write_frame(df_clean, processed_path)
     
     return df_clean
 
+def save_data_chunked(chunks, raw_path, processed_path):
+    """
+    将分块数据逐块追加写入磁盘，不在内存中保留完整数据
+    
+    返回:
+    写入的总记录数
+    """
+    with FrameAppender(raw_path) as raw, FrameAppender(processed_path) as processed:
+        for df in chunks:
+            raw.append(df)
+            processed.append(add_time_features(df))
+    
+    return raw.rows
+
 if __name__ == "__main__":
     # 生成数据
     df_raw = generate_ab_test_data()
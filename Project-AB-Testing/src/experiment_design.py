@@ -1,7 +1,88 @@
-def design_experiment():
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from power_curve import analytic_power
+
+def required_sample_size(baseline_ctr, mde, alpha=0.05, power=0.8, relative=False):
+    """
+    双比例检验（双侧）每组所需样本量的闭式解
+
+    所有参数都可以是可广播的数组，一次计算整张规划表。
+
+    参数:
+    baseline_ctr: 基准点击率
+    mde: 最小可检测效应（点击率绝对差异；relative=True 时为相对提升）
+    alpha: 显著性水平
+    power: 目标统计功效
+    """
+    p1 = np.asarray(baseline_ctr, dtype=np.float64)
+    delta = np.asarray(mde, dtype=np.float64)
+    if relative:
+        delta = p1 * delta
+    p2 = p1 + delta
+
+    z_alpha = stats.norm.ppf(1 - alpha / 2)
+    z_beta = stats.norm.ppf(power)
+    p_pooled = (p1 + p2) / 2
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        n = (z_alpha * np.sqrt(2 * p_pooled * (1 - p_pooled))
+             + z_beta * np.sqrt(p1 * (1 - p1) + p2 * (1 - p2))) ** 2 / delta ** 2
+
+    # 效应为0或实验组点击率超出 (0, 1) 时无解
+    valid = (delta != 0) & (p2 > 0) & (p2 < 1)
+    return np.where(valid, np.ceil(n), np.nan)
+
+def minimum_detectable_effect(baseline_ctr, sample_size, alpha=0.05, power=0.8, tol=1e-7):
+    """
+    给定每组样本量时可检测到的最小效应（点击率绝对提升）
+
+    对 analytic_power 做向量化二分求根，所有参数都可以是可广播的数组。
+    与 required_sample_size 一致，输入无效（样本量不是正数、基准点击率不在 [0, 1) 内）
+    或效应达到上限 1 - baseline_ctr 仍达不到目标功效时返回 NaN。
+    """
+    p1, n = np.broadcast_arrays(np.asarray(baseline_ctr, dtype=np.float64),
+                                np.asarray(sample_size, dtype=np.float64))
+    low = np.zeros_like(p1)
+    high = 1 - p1
+
+    # 无效输入（含 NaN）不参与收敛判断，最后统一置为 NaN；样本量为 0 时会出现除零
+    valid = (n > 0) & (p1 >= 0) & (p1 < 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # 功效随效应单调递增，每次迭代区间减半
+        while valid.any() and np.max((high - low)[valid]) > tol:
+            mid = (low + high) / 2
+            enough = analytic_power(p1, p1 + mid, n, alpha) >= power
+            high = np.where(enough, mid, high)
+            low = np.where(enough, low, mid)
+
+        feasible = valid & (analytic_power(p1, 1.0, n, alpha) >= power)
+    return np.where(feasible, high, np.nan)
+
+def planning_table(baselines, mdes, alpha=0.05, power=0.8, relative=False):
+    """
+    生成 基准点击率 x 最小可检测效应 的样本量规划表
+
+    返回:
+    以基准点击率为行、MDE为列的DataFrame，值为每组所需样本量
+    """
+    baselines = np.asarray(baselines, dtype=np.float64)
+    mdes = np.asarray(mdes, dtype=np.float64)
+    sizes = required_sample_size(baselines[:, None], mdes[None, :], alpha, power, relative)
+
+    table = pd.DataFrame(sizes, index=pd.Index(baselines, name='baseline_ctr'),
+                         columns=pd.Index(mdes, name='relative_mde' if relative else 'mde'))
+    return table
+
+def design_experiment(baseline_ctr=0.08, mde=0.02, alpha=0.05, power=0.8):
     """
     设计A/B测试实验方案
+
+    每组样本量由基准点击率、最小可检测效应、显著性水平和目标功效计算得到
     """
+    sample_size = int(required_sample_size(baseline_ctr, mde, alpha, power))
+
     experiment_design = {
         "hypothesis": "修改小说详情页的'开始阅读'按钮颜色从蓝色改为红色可以提升点击率",
         "metric": "点击率(CTR)",
@@ -9,9 +90,12 @@ def design_experiment():
             "control": "蓝色按钮(原版)",
             "treatment": "红色按钮(新版)"
         },
-        "success_metric": "点击率提升至少2%且统计显著(p < 0.05)",
-        "sample_size_per_group": 5000,  # 每组样本量
-        "significance_level": 0.05,
+        "success_metric": f"点击率提升至少{mde:.0%}且统计显著(p < {alpha})",
+        "baseline_ctr": baseline_ctr,
+        "minimum_detectable_effect": mde,
+        "target_power": power,
+        "sample_size_per_group": sample_size,  # 每组样本量
+        "significance_level": alpha,
         "test_duration": "7天"
     }
     return experiment_design
@@ -21,3 +105,6 @@ if __name__ == "__main__":
     print("实验设计:")
     for key, value in design.items():
         print(f"{key}: {value}")
+
+    print("\n样本量规划表 (每组):")
+    print(planning_table([0.02, 0.05, 0.08, 0.1, 0.2], [0.005, 0.01, 0.02, 0.03]))
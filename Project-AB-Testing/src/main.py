@@ -1,10 +1,37 @@
+import argparse
+import json
 import os
 import sys
+import numpy as np
+import data_generator
+import statistical_analysis
+import visualization
+import experiment_design
+import bootstrap
+import bayesian_analysis
+import power_curve
+import rendering
+import storage
 from data_generator import generate_ab_test_data, save_data
-from statistical_analysis import comprehensive_analysis, save_statistical_results, load_data
-from visualization import (plot_click_rates_comparison, plot_confidence_intervals, 
-                         plot_power_analysis, create_sample_power_curve)
+from statistical_analysis import aggregate_counts, analyze_counts, save_statistical_results, load_data
+from visualization import render_all_figures
 from experiment_design import design_experiment
+from pipeline import Step, Pipeline
+from instrumentation import enable_tracing, write_trace, stage
+
+# 流水线各步骤的输入输出文件
+DESIGN_PATH = '../results/experiment_design.json'
+RAW_PATH = '../data/raw/ab_test_raw_data.csv'
+PROCESSED_PATH = '../data/processed/ab_test_clean_data.csv'
+RESULTS_PATH = '../results/statistical_results.json'
+FIGURES_DIR = '../results/figures'
+FIGURE_PATHS = [
+    f'{FIGURES_DIR}/click_rates_comparison.png',
+    f'{FIGURES_DIR}/confidence_intervals.png',
+    f'{FIGURES_DIR}/power_analysis.png'
+]
+REPORT_PATH = '../results/ab_test_report.md'
+PIPELINE_STATE_PATH = '../results/.pipeline_state.json'
 
 def ensure_directories():
     """确保所有需要的目录都存在"""
@@ -17,8 +44,21 @@ def ensure_directories():
     for directory in directories:
         os.makedirs(directory, exist_ok=True)
 
+def bayesian_section(statistical_results):
+    """报告中的贝叶斯分析部分（旧的结果文件中没有该字段时省略）"""
+    bayesian = statistical_results.get('bayesian')
+    if not bayesian or 'prob_treatment_beats_control' not in bayesian:
+        return ''
+    return f"""### 贝叶斯分析
+- **实验组优于控制组的概率**: {bayesian['prob_treatment_beats_control']:.2%}
+- **选择实验组的期望损失**: {bayesian['expected_loss_treatment']:.5f}
+- **保持控制组的期望损失**: {bayesian['expected_loss_control']:.5f}
+"""
+
 def generate_report(statistical_results):
     """生成详细的A/B测试报告"""
+    alpha = statistical_results.get('alpha', 0.05)
+    significant = statistical_results['chi_square_test']['p_value'] < alpha
     
     report = f"""
 # A/B测试分析报告
@@ -36,12 +76,13 @@ def generate_report(statistical_results):
 
 ### 统计显著性
 - **P值**: {statistical_results['chi_square_test']['p_value']:.6f}
-- **统计显著性**: {'是' if statistical_results['chi_square_test']['p_value'] < 0.05 else '否'}
+- **统计显著性**: {'是' if significant else '否'}
 
 ### 效果估计
 - **效应量 (Cohen\'s h)**: {statistical_results['effect_size']:.3f}
-- **95% 置信区间**: [{statistical_results['confidence_intervals']['ci_lower']:.4f}, {statistical_results['confidence_intervals']['ci_upper']:.4f}]
+- **{1 - alpha:.0%} 置信区间**: [{statistical_results['confidence_intervals']['ci_lower']:.4f}, {statistical_results['confidence_intervals']['ci_upper']:.4f}]
 
+{bayesian_section(statistical_results)}
 ### 统计功效
 - **当前功效**: {statistical_results['power_analysis']['power']:.3f}
 - **模拟次数**: {statistical_results['power_analysis']['n_simulations']}
@@ -49,7 +90,7 @@ def generate_report(statistical_results):
 ## 业务建议
 
 {'✅ **推荐实施**: 实验结果显示统计显著的提升，建议全面推广红色按钮。' 
- if statistical_results['chi_square_test']['p_value'] < 0.05 and statistical_results['confidence_intervals']['difference'] > 0 
+ if significant and statistical_results['confidence_intervals']['difference'] > 0 
  else '❌ **不推荐实施**: 实验结果不显著或为负向，建议保持原方案或重新设计实验。'}
 
 ## 后续步骤
@@ -60,54 +101,84 @@ def generate_report(statistical_results):
 
     return report
 
-def main():
-    """主函数"""
-    print("🚀 开始A/B测试分析流程...")
-    
-    # 确保目录存在
-    ensure_directories()
-    
-    # 步骤1: 实验设计
+def step_design():
+    """步骤1: 实验设计"""
     print("\n📋 步骤1: 实验设计")
     design = design_experiment()
+    with open(DESIGN_PATH, 'w', encoding='utf-8') as f:
+        json.dump(design, f, indent=2, ensure_ascii=False)
     print("实验设计完成")
-    
-    # 步骤2: 生成数据
+
+def step_generate():
+    """步骤2: 生成数据"""
     print("\n📊 步骤2: 生成模拟数据")
     df_raw = generate_ab_test_data()
-    df_processed = save_data(
-        df_raw,
-        '../data/raw/ab_test_raw_data.csv',
-        '../data/processed/ab_test_clean_data.csv'
-    )
+    save_data(df_raw, RAW_PATH, PROCESSED_PATH)
     print(f"数据生成完成，共{len(df_raw)}条记录")
-    
-    # 步骤3: 统计分析
+
+def step_analyze():
+    """步骤3: 统计分析"""
     print("\n📈 步骤3: 统计分析")
-    df = load_data('../data/processed/ab_test_clean_data.csv')
-    statistical_results = comprehensive_analysis(df)
-    save_statistical_results(statistical_results, '../results/statistical_results.json')
+    with stage('load_data') as span:
+        df = load_data(PROCESSED_PATH, columns=['group', 'clicked'])
+        span.set_rows(len(df))
+    with stage('aggregate_counts', rows=len(df)):
+        counts = aggregate_counts(df)
+    # 与批量实验一致，固定功效模拟的随机种子，保证结果可复现
+    np.random.seed(42)
+    statistical_results = analyze_counts(counts)
+    save_statistical_results(statistical_results, RESULTS_PATH)
     print("统计分析完成")
-    
-    # 步骤4: 可视化
+
+def step_figures():
+    """
+    步骤4: 可视化
+
+    流水线只在输入、代码变化或 --force 时执行该步骤，此时全部图表都重新渲染，
+    不再由单张图表的渲染缓存判断是否跳过。
+    """
     print("\n🎨 步骤4: 生成可视化图表")
-    plot_click_rates_comparison(df, '../results/figures/click_rates_comparison.png')
-    plot_confidence_intervals(df, '../results/figures/confidence_intervals.png')
-    
-    sample_sizes, power_levels = create_sample_power_curve()
-    plot_power_analysis(sample_sizes, power_levels, '../results/figures/power_analysis.png')
-    print("可视化完成")
-    
-    # 步骤5: 生成报告
+    df = load_data(PROCESSED_PATH, columns=['group', 'clicked'])
+    figures = render_all_figures(aggregate_counts(df), FIGURES_DIR, force=True)
+    print(f"可视化完成（渲染 {len(figures['rendered'])} 张图表）")
+
+def step_report():
+    """步骤5: 生成报告"""
     print("\n📝 步骤5: 生成分析报告")
-    report = generate_report(statistical_results)
+    with open(RESULTS_PATH, 'r') as f:
+        statistical_results = json.load(f)
+    
+    with open(REPORT_PATH, 'w', encoding='utf-8') as f:
+        f.write(generate_report(statistical_results))
     
-    with open('../results/ab_test_report.md', 'w', encoding='utf-8') as f:
-        f.write(report)
+    print(f"分析报告已保存至: {REPORT_PATH}")
+
+def build_pipeline():
+    """
+    构建A/B测试流水线
     
-    print("分析报告已保存至: ../results/ab_test_report.md")
+    每个步骤声明输入、输出和影响结果的代码（函数或模块），
+    只有代码或输入内容发生变化的步骤才会重新执行。
+    """
+    steps = [
+        Step('design', step_design, outputs=[DESIGN_PATH],
+             code=[step_design, experiment_design]),
+        Step('generate', step_generate, outputs=[RAW_PATH, PROCESSED_PATH],
+             code=[step_generate, data_generator, storage]),
+        Step('analyze', step_analyze, inputs=[PROCESSED_PATH], outputs=[RESULTS_PATH],
+             code=[step_analyze, statistical_analysis, bayesian_analysis, bootstrap, storage]),
+        Step('figures', step_figures, inputs=[PROCESSED_PATH], outputs=FIGURE_PATHS,
+             code=[step_figures, visualization, power_curve, rendering, statistical_analysis]),
+        Step('report', step_report, inputs=[RESULTS_PATH], outputs=[REPORT_PATH],
+             code=[step_report, generate_report, bayesian_section])
+    ]
+    return Pipeline(steps, PIPELINE_STATE_PATH)
+
+def print_summary(statistical_results):
+    """输出关键结果和决策建议"""
+    alpha = statistical_results.get('alpha', 0.05)
+    significant = statistical_results['chi_square_test']['p_value'] < alpha
     
-    # 输出关键结果
     print("\n" + "="*50)
     print("🎯 A/B测试关键结果摘要")
     print("="*50)
@@ -115,14 +186,54 @@ def main():
     print(f"实验组CTR: {statistical_results['click_rates']['ctr']['treatment']:.3%}")
     print(f"提升幅度: {statistical_results['confidence_intervals']['difference']:.3%}")
     print(f"P值: {statistical_results['chi_square_test']['p_value']:.6f}")
-    print(f"统计显著性: {'是' if statistical_results['chi_square_test']['p_value'] < 0.05 else '否'}")
+    print(f"统计显著性: {'是' if significant else '否'}")
     print(f"统计功效: {statistical_results['power_analysis']['power']:.3f}")
     
     # 给出决策建议
-    if statistical_results['chi_square_test']['p_value'] < 0.05 and statistical_results['confidence_intervals']['difference'] > 0:
+    if significant and statistical_results['confidence_intervals']['difference'] > 0:
         print("\n✅ 建议: 实验结果统计显著且正向，推荐实施新方案")
     else:
         print("\n❌ 建议: 实验结果不显著或负向，建议保持原方案")
 
+def main(argv=None):
+    """主函数"""
+    parser = argparse.ArgumentParser(description='A/B测试分析流程（只重新执行过期的步骤）')
+    parser.add_argument('--force', nargs='*', metavar='STEP',
+                        help='强制执行指定步骤；不指定步骤时强制执行全部步骤')
+    parser.add_argument('--only', nargs='+', metavar='STEP',
+                        help='只执行指定步骤（design / generate / analyze / figures / report）')
+    parser.add_argument('--trace', metavar='PATH', help='记录各阶段耗时和内存并输出JSON追踪文件')
+    parser.add_argument('--chrome-trace', action='store_true', help='追踪文件使用Chrome trace格式')
+    args = parser.parse_args(argv)
+    
+    if args.trace:
+        enable_tracing(args.trace + '.events.jsonl', reset=True)
+    
+    print("🚀 开始A/B测试分析流程...")
+    
+    # 确保目录存在
+    ensure_directories()
+    
+    pipeline = build_pipeline()
+    unknown = (set(args.force or []) | set(args.only or [])) - set(pipeline.steps)
+    if unknown:
+        parser.error(f"未知的步骤: {', '.join(sorted(unknown))}")
+    
+    summary = pipeline.run(force=args.force, only=args.only)
+    
+    print("\n⏱️ 步骤执行情况:")
+    for name, info in summary.items():
+        status = '执行' if info['status'] == 'ran' else '跳过（未变化）'
+        print(f"  {name}: {status} ({info['seconds']:.3f}s)")
+    
+    if os.path.exists(RESULTS_PATH):
+        with open(RESULTS_PATH, 'r') as f:
+            print_summary(json.load(f))
+    
+    if args.trace:
+        write_trace(args.trace, chrome=args.chrome_trace)
+        os.remove(args.trace + '.events.jsonl')
+        print(f"\n追踪文件已保存至: {args.trace}")
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,148 @@
+import hashlib
+import inspect
+import json
+import os
+import time
+
+from instrumentation import stage
+
+class Step:
+    """
+    流水线中的一个步骤
+
+    参数:
+    name: 步骤名
+    func: 无参数的执行函数
+    inputs: 输入文件路径列表
+    outputs: 输出文件路径列表
+    code: 影响结果的函数列表，其源代码参与指纹计算（默认只有 func 本身）
+    params: 影响结果的参数（需可JSON序列化），参与指纹计算
+    """
+
+    def __init__(self, name, func, inputs=(), outputs=(), code=None, params=None):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.code = list(code) if code is not None else [func]
+        self.params = params or {}
+
+class Pipeline:
+    """
+    基于内容哈希的增量流水线
+
+    步骤之间的依赖由文件推断: 某步骤的输入是另一步骤的输出时，前者依赖后者。
+    每个步骤的指纹由代码、参数和输入文件内容哈希组成，只有指纹变化或输出缺失的步骤才会重新执行。
+    文件哈希按 (大小, 修改时间) 缓存，未改动的大文件不会被重复读取。
+    """
+
+    def __init__(self, steps, state_path):
+        self.steps = {step.name: step for step in steps}
+        self.state_path = state_path
+        self.state = self._load_state()
+        self.order = self._topological_order()
+
+    def _load_state(self):
+        if os.path.exists(self.state_path):
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {'fingerprints': {}, 'files': {}}
+
+    def _save_state(self):
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        with open(self.state_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2, ensure_ascii=False)
+
+    def _topological_order(self):
+        """按文件依赖对步骤排序"""
+        producers = {path: step.name for step in self.steps.values() for path in step.outputs}
+        order = []
+        visiting = set()
+
+        def visit(name):
+            if name in order:
+                return
+            if name in visiting:
+                raise ValueError(f"流水线存在循环依赖: {name}")
+            visiting.add(name)
+            for path in self.steps[name].inputs:
+                if path in producers:
+                    visit(producers[path])
+            visiting.discard(name)
+            order.append(name)
+
+        for name in self.steps:
+            visit(name)
+        return order
+
+    def file_hash(self, path):
+        """文件内容哈希（按大小和修改时间缓存）"""
+        stat = os.stat(path)
+        cached = self.state['files'].get(path)
+        if cached and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+            return cached['sha256']
+
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha.update(block)
+        digest = sha.hexdigest()
+        self.state['files'][path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest}
+        return digest
+
+    def fingerprint(self, step):
+        """步骤指纹: 代码、参数和输入内容"""
+        payload = {
+            'code': [inspect.getsource(func) for func in step.code],
+            'params': step.params,
+            'inputs': {path: self.file_hash(path) if os.path.exists(path) else None for path in step.inputs}
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def is_stale(self, step):
+        """指纹变化或任一输出缺失时需要重新执行"""
+        if any(not os.path.exists(path) for path in step.outputs):
+            return True
+        return self.state['fingerprints'].get(step.name) != self.fingerprint(step)
+
+    def run(self, force=None, only=None):
+        """
+        按依赖顺序执行过期的步骤
+
+        参数:
+        force: 强制执行的步骤名列表；传入空列表表示强制执行全部步骤，None 表示不强制
+        only: 只考虑这些步骤（其余步骤即使过期也不执行）
+
+        返回:
+        {步骤名: 'ran' / 'skipped'} 以及各步骤耗时
+        """
+        for name in list(force or []) + list(only or []):
+            if name not in self.steps:
+                raise ValueError(f"未知的步骤: {name}")
+
+        force_all = force is not None and len(force) == 0
+        summary = {}
+
+        for name in self.order:
+            step = self.steps[name]
+            if only and name not in only:
+                continue
+
+            start = time.perf_counter()
+            if force_all or (force and name in force) or self.is_stale(step):
+                with stage(name):
+                    step.func()
+                # 重新计算指纹，输入可能被上游步骤更新
+                self.state['fingerprints'][name] = self.fingerprint(step)
+                for path in step.outputs:
+                    if os.path.exists(path):
+                        self.file_hash(path)
+                self._save_state()
+                status = 'ran'
+            else:
+                status = 'skipped'
+
+            summary[name] = {'status': status, 'seconds': round(time.perf_counter() - start, 4)}
+
+        self._save_state()
+        return summary
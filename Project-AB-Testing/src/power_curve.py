@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+from scipy import stats
+
+from statistical_analysis import batch_chi_square_2x2
+
+DEFAULT_SAMPLE_SIZES = [500, 1000, 2000, 5000, 8000, 10000, 15000, 20000]
+DEFAULT_CACHE_DIR = '../results/cache/power_curves'
+
+def analytic_power(control_ctr, treatment_ctr, sample_size, alpha=0.05):
+    """
+    双比例检验统计功效的正态近似（双侧）
+
+    所有参数都可以是可广播的数组，适合一次性计算整个网格。
+    未做Yates校正，因此比 chi_square_test 的实际功效略高。
+    """
+    p1 = np.asarray(control_ctr, dtype=np.float64)
+    p2 = np.asarray(treatment_ctr, dtype=np.float64)
+    n = np.asarray(sample_size, dtype=np.float64)
+
+    z_alpha = stats.norm.ppf(1 - alpha / 2)
+    p_pooled = (p1 + p2) / 2
+
+    # 原假设与备择假设下的标准误
+    se_null = np.sqrt(2 * p_pooled * (1 - p_pooled) / n)
+    se_alt = np.sqrt((p1 * (1 - p1) + p2 * (1 - p2)) / n)
+    diff = np.abs(p2 - p1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        power = (stats.norm.cdf((diff - z_alpha * se_null) / se_alt)
+                 + stats.norm.cdf((-diff - z_alpha * se_null) / se_alt))
+
+    # 两组点击率相同时功效即为显著性水平
+    return np.where(se_alt > 0, power, alpha)
+
+def simulated_power(control_ctr, treatment_ctr, sample_size, alpha=0.05, n_simulations=10000,
+                    seed=42, chunk_size=200000):
+    """
+    通过模拟计算网格上每个点的统计功效
+
+    参数先广播成同一形状，每个分块对整个网格一次性抽样并批量做卡方检验。
+    使用独立的随机数生成器，相同 seed 下结果可重现且不影响全局随机状态。
+    """
+    p1, p2, n = np.broadcast_arrays(
+        np.asarray(control_ctr, dtype=np.float64),
+        np.asarray(treatment_ctr, dtype=np.float64),
+        np.asarray(sample_size, dtype=np.int64)
+    )
+    shape = p1.shape
+    p1, p2, n = p1.ravel(), p2.ravel(), n.ravel()
+
+    rng = np.random.default_rng(seed)
+    significant = np.zeros(len(n), dtype=np.int64)
+
+    # 按网格大小调整每批的模拟次数，控制内存
+    sims_per_chunk = max(1, chunk_size // max(1, len(n)))
+    for start in range(0, n_simulations, sims_per_chunk):
+        batch = min(sims_per_chunk, n_simulations - start)
+        control_clicks = rng.binomial(n[:, None], p1[:, None], size=(len(n), batch))
+        treatment_clicks = rng.binomial(n[:, None], p2[:, None], size=(len(n), batch))
+
+        _, p_values = batch_chi_square_2x2(control_clicks, n[:, None], treatment_clicks, n[:, None])
+        significant += np.count_nonzero(p_values < alpha, axis=1)
+
+    return (significant / n_simulations).reshape(shape)
+
+def _cache_path(cache_dir, key):
+    """根据参数生成缓存文件路径"""
+    digest = hashlib.sha256(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir, f'power_curve_{digest}.json')
+
+def compute_power_curve(control_ctr, treatment_ctr, sample_sizes=None, effect_sizes=None, alpha=0.05,
+                        method='analytic', n_simulations=10000, seed=42, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    计算样本量 x 效应大小网格上的统计功效，并缓存到磁盘
+
+    参数:
+    control_ctr: 控制组点击率（基准线）
+    treatment_ctr: 实验组点击率，观测到的差异总是包含在效应网格中
+    sample_sizes: 每组样本量网格
+    effect_sizes: 点击率绝对差异网格
+    alpha: 显著性水平
+    method: 'analytic'（正态近似）或 'simulation'（批量模拟）
+    n_simulations, seed: 仅模拟模式使用
+    cache_dir: 缓存目录，为 None 时不使用缓存
+
+    返回:
+    包含 sample_sizes、effect_sizes、power（二维列表，行对应效应大小）和 observed_effect 的字典
+    """
+    if method not in ('analytic', 'simulation'):
+        raise ValueError(f"未知的功效计算方法: {method}")
+
+    control_ctr = round(float(control_ctr), 6)
+    treatment_ctr = round(float(treatment_ctr), 6)
+    observed_effect = round(treatment_ctr - control_ctr, 6)
+
+    sample_sizes = [int(n) for n in (sample_sizes or DEFAULT_SAMPLE_SIZES)]
+    if effect_sizes is None:
+        effect_sizes = [observed_effect * k for k in (0.5, 0.75, 1.0, 1.25, 1.5)]
+    effect_sizes = sorted({round(float(e), 6) for e in effect_sizes} | {observed_effect})
+
+    key = {
+        'control_ctr': control_ctr,
+        'treatment_ctr': treatment_ctr,
+        'alpha': alpha,
+        'sample_sizes': sample_sizes,
+        'effect_sizes': effect_sizes,
+        'method': method
+    }
+    if method == 'simulation':
+        key.update({'n_simulations': n_simulations, 'seed': seed})
+
+    # 命中缓存则直接返回
+    if cache_dir:
+        path = _cache_path(cache_dir, key)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+
+    # 构建网格: 行为效应大小，列为样本量
+    effects = np.array(effect_sizes)[:, None]
+    sizes = np.array(sample_sizes)[None, :]
+    treatment_grid = np.clip(control_ctr + effects, 0.0, 1.0)
+
+    if method == 'analytic':
+        power = analytic_power(control_ctr, treatment_grid, sizes, alpha)
+    else:
+        power = simulated_power(control_ctr, treatment_grid, sizes, alpha,
+                                n_simulations=n_simulations, seed=seed)
+
+    result = dict(key)
+    result['observed_effect'] = observed_effect
+    result['power'] = np.broadcast_to(power, (len(effect_sizes), len(sample_sizes))).round(6).tolist()
+
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+
+    return result
+
+def observed_power_curve(curve):
+    """从功效网格中取出观测效应对应的样本量-功效曲线"""
+    row = curve['effect_sizes'].index(curve['observed_effect'])
+    return curve['sample_sizes'], curve['power'][row]
+
+if __name__ == "__main__":
+    curve = compute_power_curve(0.0835, 0.1078)
+    sample_sizes, power_levels = observed_power_curve(curve)
+    for size, power in zip(sample_sizes, power_levels):
+        print(f"每组样本量 {size}: 功效 {power:.3f}")
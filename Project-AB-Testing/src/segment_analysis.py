@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from statistical_analysis import load_data, batch_chi_square_2x2
+
+def segment_counts(df, segment_cols):
+    """
+    一次分组扫描得到每个细分的各组计数
+
+    参数:
+    df: 明细数据，需包含 group、clicked 以及细分字段
+    segment_cols: 细分字段名或字段名列表（例如 'date'、['date', 'hour']）
+
+    返回:
+    以细分为索引，包含 control_count、control_clicks、treatment_count、treatment_clicks 的DataFrame
+    """
+    if isinstance(segment_cols, str):
+        segment_cols = [segment_cols]
+
+    grouped = df.groupby(list(segment_cols) + ['group'], observed=True)['clicked'].agg([
+        ('count', 'count'),
+        ('clicks', 'sum')
+    ])
+    wide = grouped.unstack('group', fill_value=0)
+    wide.columns = [f'{group}_{stat}' for stat, group in wide.columns]
+
+    columns = ['control_count', 'control_clicks', 'treatment_count', 'treatment_clicks']
+    return wide.reindex(columns=columns, fill_value=0).astype('int64')
+
+def adjust_p_values(p_values, method='fdr_bh'):
+    """
+    多重检验校正
+
+    参数:
+    method: 'fdr_bh'（Benjamini-Hochberg）、'bonferroni' 或 None（不校正）
+    """
+    p_values = np.asarray(p_values, dtype=np.float64)
+    if method is None:
+        return p_values
+
+    valid = ~np.isnan(p_values)
+    m = int(valid.sum())
+    adjusted = np.full_like(p_values, np.nan)
+    if m == 0:
+        return adjusted
+
+    if method == 'bonferroni':
+        adjusted[valid] = np.minimum(p_values[valid] * m, 1.0)
+    elif method == 'fdr_bh':
+        p = p_values[valid]
+        order = np.argsort(p)
+        ranked = p[order] * m / np.arange(1, m + 1)
+        # 从大到小取累计最小值，保证单调
+        ranked = np.minimum.accumulate(ranked[::-1])[::-1]
+        result = np.empty(m)
+        result[order] = np.minimum(ranked, 1.0)
+        adjusted[valid] = result
+    else:
+        raise ValueError(f"未知的多重检验校正方法: {method}")
+
+    return adjusted
+
+def analyze_segment_counts(counts, alpha=0.05, correction='fdr_bh'):
+    """
+    对所有细分向量化计算卡方检验、置信区间和效应量
+
+    参数:
+    counts: segment_counts 的结果
+    alpha: 显著性水平
+    correction: 多重检验校正方法，见 adjust_p_values
+    """
+    n_c = counts['control_count'].to_numpy(dtype=np.float64)
+    x_c = counts['control_clicks'].to_numpy(dtype=np.float64)
+    n_t = counts['treatment_count'].to_numpy(dtype=np.float64)
+    x_t = counts['treatment_clicks'].to_numpy(dtype=np.float64)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p_c = x_c / n_c
+        p_t = x_t / n_t
+        diff = p_t - p_c
+
+        # 比例差的Wald置信区间
+        se = np.sqrt(p_c * (1 - p_c) / n_c + p_t * (1 - p_t) / n_t)
+        margin_of_error = stats.norm.ppf(1 - alpha / 2) * se
+
+        relative_improvement = diff / p_c
+
+    chi2, p_values = batch_chi_square_2x2(x_c, n_c, x_t, n_t)
+    adjusted = adjust_p_values(p_values, correction)
+
+    results = pd.DataFrame({
+        'control_count': counts['control_count'],
+        'treatment_count': counts['treatment_count'],
+        'control_ctr': p_c,
+        'treatment_ctr': p_t,
+        'difference': diff,
+        'ci_lower': diff - margin_of_error,
+        'ci_upper': diff + margin_of_error,
+        'relative_improvement': relative_improvement,
+        'effect_size': np.abs(2 * (np.arcsin(np.sqrt(p_t)) - np.arcsin(np.sqrt(p_c)))),
+        'chi2_statistic': chi2,
+        'p_value': p_values,
+        'p_value_adjusted': adjusted
+    }, index=counts.index)
+    results['significant'] = results['p_value_adjusted'] < alpha
+
+    return results
+
+def segmented_analysis(df, segment_cols, alpha=0.05, correction='fdr_bh'):
+    """按细分字段执行A/B测试分析"""
+    return analyze_segment_counts(segment_counts(df, segment_cols), alpha, correction)
+
+if __name__ == "__main__":
+    # 加载数据
+    df = load_data('../data/processed/ab_test_clean_data.csv')
+
+    # 按日期细分分析
+    results = segmented_analysis(df, 'date')
+    print("按日期细分的分析结果:")
+    print(results[['control_ctr', 'treatment_ctr', 'difference', 'p_value', 'p_value_adjusted', 'significant']])
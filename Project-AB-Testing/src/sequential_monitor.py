@@ -0,0 +1,116 @@
+import math
+
+import numpy as np
+
+class SequentialMonitor:
+    """
+    实验的在线序贯检验监控器（mSPRT）
+
+    每个曝光/点击事件以O(1)更新各组计数和检验状态，任何时刻都可以查询始终有效（always-valid）的
+    p值和置信序列，因此看板可以高频轮询，实验也可以在得出结论后提前停止，
+    而不会像反复做卡方检验那样膨胀第一类错误。
+
+    检验统计量基于点击率差异的正态近似，混合先验为 N(0, tau^2)，
+    tau 的单位是点击率的绝对差异，应取与预期效应相当的量级。
+    """
+
+    def __init__(self, alpha=0.05, tau=0.02, groups=('control', 'treatment')):
+        self.alpha = alpha
+        self.tau = tau
+        self.control, self.treatment = groups
+        self.exposures = {group: 0 for group in groups}
+        self.clicks = {group: 0 for group in groups}
+        self.p_value = 1.0
+        self.ci_lower = -np.inf
+        self.ci_upper = np.inf
+
+    def update(self, group, clicked):
+        """记录一次曝光事件及是否点击"""
+        self.exposures[group] += 1
+        self.clicks[group] += int(clicked)
+        self._refresh()
+
+    def update_counts(self, group, exposures, clicks):
+        """批量记录某组新增的曝光数和点击数"""
+        self.exposures[group] += int(exposures)
+        self.clicks[group] += int(clicks)
+        self._refresh()
+
+    def _estimate(self):
+        """当前的点击率差异估计及其方差"""
+        n_c = self.exposures[self.control]
+        n_t = self.exposures[self.treatment]
+        if n_c == 0 or n_t == 0:
+            return 0.0, 0.0
+
+        p_c = self.clicks[self.control] / n_c
+        p_t = self.clicks[self.treatment] / n_t
+        variance = p_c * (1 - p_c) / n_c + p_t * (1 - p_t) / n_t
+        return p_t - p_c, variance
+
+    def _refresh(self):
+        """
+        用当前计数更新检验状态（每次更新计数后调用）
+
+        p值取历次更新的最小值，置信序列取历次区间的交集，两者在任意时刻都有效。
+        """
+        diff, variance = self._estimate()
+        if variance <= 0:
+            return
+
+        tau2 = self.tau ** 2
+        # 混合似然比
+        log_lr = 0.5 * math.log(variance / (variance + tau2)) \
+            + diff ** 2 * tau2 / (2 * variance * (variance + tau2))
+        self.p_value = min(self.p_value, math.exp(-log_lr))
+
+        # 置信序列半宽
+        radius = math.sqrt(variance * (variance + tau2) / tau2
+                           * (2 * math.log(1 / self.alpha) + math.log((variance + tau2) / variance)))
+        self.ci_lower = max(self.ci_lower, diff - radius)
+        self.ci_upper = min(self.ci_upper, diff + radius)
+
+    def status(self):
+        """查询当前检验状态（状态在更新计数时已经计算好，查询不会改变结果）"""
+        diff, _ = self._estimate()
+        return {
+            'exposures': dict(self.exposures),
+            'clicks': dict(self.clicks),
+            'difference': diff,
+            'p_value': self.p_value,
+            'ci_lower': self.ci_lower,
+            'ci_upper': self.ci_upper,
+            'decision': self.decision()
+        }
+
+    def decision(self):
+        """根据当前置信序列给出决策"""
+        if self.p_value >= self.alpha:
+            return 'continue'
+        if self.ci_lower > 0:
+            return 'treatment_better'
+        if self.ci_upper < 0:
+            return 'control_better'
+        return 'continue'
+
+    def should_stop(self):
+        """是否可以提前停止实验"""
+        return self.decision() != 'continue'
+
+if __name__ == "__main__":
+    np.random.seed(42)
+    monitor = SequentialMonitor()
+
+    for i in range(1, 20001):
+        group = 'control' if np.random.rand() < 0.5 else 'treatment'
+        ctr = 0.08 if group == 'control' else 0.105
+        monitor.update(group, np.random.rand() < ctr)
+
+        # 模拟看板每1000个事件轮询一次
+        if i % 1000 == 0:
+            result = monitor.status()
+            print(f"事件数 {i}: p值 {result['p_value']:.4f}, "
+                  f"置信序列 [{result['ci_lower']:.4f}, {result['ci_upper']:.4f}], 决策 {result['decision']}")
+            if monitor.should_stop():
+                print("已得出结论，提前停止实验")
+                break
@@ -2,25 +2,113 @@ import numpy as np
 import pandas as pd
 from scipy import stats
 import json
+import os
+from bootstrap import poisson_bootstrap, buckets_from_counts
+from bayesian_analysis import bayesian_analysis
+from storage import read_frame, iter_frames, apply_ab_schema
+from instrumentation import stage
 
-def load_data(file_path):
-    """加载处理后的数据"""
-    return pd.read_csv(file_path)
+def load_data(file_path, columns=None):
+    """
+    加载处理后的数据
+    
+    参数:
+    file_path: 数据文件路径（.csv / .parquet / .feather）
+    columns: 只加载指定的列，分析阶段只需要 ['group', 'clicked']
+    
+    返回的列统一转换为紧凑类型（见 storage.AB_DTYPES）
+    """
+    return apply_ab_schema(read_frame(file_path, columns))
 
-def calculate_click_rates(df):
-    """计算各组的点击率"""
-    results = df.groupby('group')['clicked'].agg([
+def aggregate_counts(df, metric='clicked'):
+    """
+    一次扫描将明细数据汇总为各组的充分统计量
+    
+    参数:
+    metric: 0/1 指标列名
+    
+    返回:
+    以 group 为索引、包含 count（样本量）和 clicks（点击数）两列的DataFrame。
+    后续所有检验、置信区间、效应量、功效计算和绘图都只依赖这个汇总结果。
+    """
+    counts = df.groupby('group', observed=True)[metric].agg([
         ('count', 'count'),
-        ('clicks', 'sum'),
-        ('ctr', 'mean')
-    ]).round(4)
+        ('clicks', 'sum')
+    ])
+    return counts.astype('int64')
+
+def counts_from_dict(group_counts):
+    """
+    由已汇总的计数构建充分统计量（例如数据仓库中预先聚合的结果）
     
-    return results
+    参数:
+    group_counts: {'control': {'count': 5000, 'clicks': 418}, 'treatment': {...}}
+    """
+    counts = pd.DataFrame.from_dict(group_counts, orient='index')[['count', 'clicks']]
+    counts.index.name = 'group'
+    return counts.sort_index().astype('int64')
 
-def chi_square_test(df):
-    """执行卡方检验"""
-    # 创建列联表
-    contingency_table = pd.crosstab(df['group'], df['clicked'])
+def merge_counts(left, right):
+    """合并两份计数（计数可加，适合增量汇总）"""
+    if left is None:
+        return right
+    return left.add(right, fill_value=0).astype('int64')
+
+def iter_batches(source, chunksize=1000000, columns=('group', 'clicked')):
+    """
+    将数据源统一为DataFrame分块迭代器
+    
+    参数:
+    source: 数据文件路径（.csv / .parquet / .feather），
+            或记录批次的可迭代对象（DataFrame、带 to_pandas() 的Arrow批次、列字典）
+    chunksize: 读取文件时每块的行数
+    columns: 读取文件时只读取这些列（默认为分析需要的 group 和 clicked）
+    """
+    if isinstance(source, (str, os.PathLike)):
+        for batch in iter_frames(source, list(columns), chunksize):
+            yield apply_ab_schema(batch)
+        return
+    
+    for batch in source:
+        if hasattr(batch, 'to_pandas'):
+            batch = batch.to_pandas()
+        elif not isinstance(batch, pd.DataFrame):
+            batch = pd.DataFrame(batch)
+        yield batch
+
+def stream_counts(source, chunksize=1000000, metric='clicked'):
+    """
+    分块读取数据并增量汇总为各组计数，峰值内存只与分块大小有关
+    
+    参数:
+    metric: 0/1 指标列名
+    """
+    counts = None
+    for batch in iter_batches(source, chunksize, columns=('group', metric)):
+        counts = merge_counts(counts, aggregate_counts(batch, metric))
+    
+    if counts is None:
+        raise ValueError("数据源为空，无法汇总计数")
+    
+    return counts
+
+def click_rates_from_counts(counts):
+    """根据各组计数计算点击率"""
+    results = counts[['count', 'clicks']].copy()
+    results['ctr'] = results['clicks'] / results['count']
+    return results.round(4)
+
+def calculate_click_rates(df):
+    """计算各组的点击率"""
+    return click_rates_from_counts(aggregate_counts(df))
+
+def chi_square_test_from_counts(counts):
+    """根据各组计数执行卡方检验"""
+    # 创建列联表（列顺序与 pd.crosstab(group, clicked) 一致: 未点击, 点击）
+    contingency_table = np.column_stack([
+        counts['count'] - counts['clicks'],
+        counts['clicks']
+    ])
     
     # 执行卡方检验
     chi2, p_value, dof, expected = stats.chi2_contingency(contingency_table)
@@ -32,6 +120,10 @@ def chi_square_test(df):
         'expected_frequencies': expected.tolist()
     }
 
+def chi_square_test(df):
+    """执行卡方检验"""
+    return chi_square_test_from_counts(aggregate_counts(df))
+
 def calculate_confidence_interval(clicks_a, total_a, clicks_b, total_b, alpha=0.05):
     """计算两组比例差的置信区间"""
     p_a = clicks_a / total_a
@@ -59,41 +151,78 @@ def calculate_confidence_interval(clicks_a, total_a, clicks_b, total_b, alpha=0.
         'relative_improvement': (p_b - p_a) / p_a
     }
 
-def manual_power_analysis(control_ctr, treatment_ctr, sample_size, alpha=0.05, n_simulations=10000):
+def batch_chi_square_2x2(control_clicks, control_total, treatment_clicks, treatment_total):
+    """
+    批量计算2x2列联表的卡方检验（含Yates连续性校正）
+    
+    与 stats.chi2_contingency 对2x2表的结果一致，但对整批数组一次性计算。
+    期望频数含0的表（例如两组均无点击）无法检验，返回 NaN。
+    
+    参数:
+    control_clicks, treatment_clicks: 各组点击数（数组）
+    control_total, treatment_total: 各组样本量（标量或数组）
+    
+    返回:
+    (chi2统计量数组, p值数组)
+    """
+    a = np.asarray(control_clicks, dtype=np.float64)
+    b = np.asarray(control_total, dtype=np.float64) - a
+    c = np.asarray(treatment_clicks, dtype=np.float64)
+    d = np.asarray(treatment_total, dtype=np.float64) - c
+    
+    n = a + b + c + d
+    row_control = a + b
+    row_treatment = c + d
+    col_click = a + c
+    col_no_click = b + d
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # 2x2表中每个单元格的 |O - E| 都相同
+        deviation = np.abs(a * d - b * c) / n
+        # Yates校正: 每个单元格向期望值靠拢 min(0.5, |O - E|)
+        corrected = np.maximum(deviation - 0.5, 0.0)
+        inverse_expected_sum = n * (1 / (row_control * col_click) + 1 / (row_control * col_no_click)
+                                    + 1 / (row_treatment * col_click) + 1 / (row_treatment * col_no_click))
+        chi2 = corrected ** 2 * inverse_expected_sum
+    
+    valid = (row_control > 0) & (row_treatment > 0) & (col_click > 0) & (col_no_click > 0)
+    chi2 = np.where(valid, chi2, np.nan)
+    p_values = stats.chi2.sf(chi2, 1)
+    
+    return chi2, p_values
+
+def manual_power_analysis(control_ctr, treatment_ctr, sample_size, alpha=0.05, n_simulations=10000,
+                          chunk_size=200000):
     """
     手动实现统计功效分析通过模拟
     
+    每个分块一次性抽取所有模拟的二项分布点击数，并批量计算卡方检验，
+    内存占用只与 chunk_size 有关。抽样顺序与逐次模拟（先控制组后实验组）一致，
+    因此相同随机种子下结果与逐次调用 stats.chi2_contingency 相同。
+    
     参数:
     control_ctr: 控制组真实点击率
     treatment_ctr: 实验组真实点击率  
     sample_size: 每组样本量
     alpha: 显著性水平
     n_simulations: 模拟次数
+    chunk_size: 每批模拟次数
     """
     significant_results = 0
+    probabilities = np.array([control_ctr, treatment_ctr])
     
-    for _ in range(n_simulations):
-        # 模拟控制组数据
-        control_clicks = np.random.binomial(sample_size, control_ctr)
-        
-        # 模拟实验组数据
-        treatment_clicks = np.random.binomial(sample_size, treatment_ctr)
-        
-        # 创建列联表
-        control_no_clicks = sample_size - control_clicks
-        treatment_no_clicks = sample_size - treatment_clicks
-        
-        contingency_table = np.array([
-            [control_clicks, control_no_clicks],
-            [treatment_clicks, treatment_no_clicks]
-        ])
-        
-        # 执行卡方检验
-        _, p_value, _, _ = stats.chi2_contingency(contingency_table)
-        
-        # 检查是否显著
-        if p_value < alpha:
-            significant_results += 1
+    with stage('manual_power_analysis', rows=n_simulations):
+        for start in range(0, n_simulations, chunk_size):
+            batch = min(chunk_size, n_simulations - start)
+            
+            # 交替抽取控制组和实验组的点击数
+            clicks = np.random.binomial(sample_size, np.tile(probabilities, batch)).reshape(batch, 2)
+            
+            # 批量执行卡方检验
+            _, p_values = batch_chi_square_2x2(clicks[:, 0], sample_size, clicks[:, 1], sample_size)
+            
+            # 统计显著的模拟次数
+            significant_results += int(np.count_nonzero(p_values < alpha))
     
     # 计算统计功效
     power = significant_results / n_simulations
@@ -110,35 +239,47 @@ def calculate_effect_size(control_ctr, treatment_ctr):
     h = 2 * (np.arcsin(np.sqrt(treatment_ctr)) - np.arcsin(np.sqrt(control_ctr)))
     return abs(h)
 
-def comprehensive_analysis(df):
-    """执行全面的统计分析"""
-    # 基础点击率计算
-    click_rates = calculate_click_rates(df)
+def analyze_counts(counts, n_simulations=100000, ci_method='wald', alpha=0.05, bayesian=True):
+    """
+    基于各组计数执行全面的统计分析
     
-    # 提取数据用于后续计算
-    control_data = df[df['group'] == 'control']['clicked']
-    treatment_data = df[df['group'] == 'treatment']['clicked']
+    参数:
+    counts: aggregate_counts 或 counts_from_dict 的结果
+    n_simulations: 功效分析的模拟次数（批量模拟开销很小，使用更多次数以获得稳定估计）
+    ci_method: 置信区间方法，'wald'（正态近似）或 'bootstrap'（Poisson自助法）
+    alpha: 显著性水平
+    bayesian: 是否同时给出贝叶斯分析结果（实验组胜出概率、期望损失等）
+    """
+    # 基础点击率计算
+    click_rates = click_rates_from_counts(counts)
     
-    control_clicks = control_data.sum()
-    control_total = len(control_data)
-    treatment_clicks = treatment_data.sum()
-    treatment_total = len(treatment_data)
+    control_clicks = int(counts.loc['control', 'clicks'])
+    control_total = int(counts.loc['control', 'count'])
+    treatment_clicks = int(counts.loc['treatment', 'clicks'])
+    treatment_total = int(counts.loc['treatment', 'count'])
     
     # 假设检验
-    chi2_results = chi_square_test(df)
+    chi2_results = chi_square_test_from_counts(counts)
     
     # 置信区间
-    ci_results = calculate_confidence_interval(
-        control_clicks, control_total, 
-        treatment_clicks, treatment_total
-    )
+    if ci_method == 'wald':
+        ci_results = calculate_confidence_interval(
+            control_clicks, control_total, 
+            treatment_clicks, treatment_total,
+            alpha=alpha
+        )
+    elif ci_method == 'bootstrap':
+        ci_results = poisson_bootstrap(buckets_from_counts(counts), alpha=alpha)
+    else:
+        raise ValueError(f"未知的置信区间方法: {ci_method}")
     
     # 统计功效分析
     power_results = manual_power_analysis(
         control_ctr=click_rates.loc['control', 'ctr'],
         treatment_ctr=click_rates.loc['treatment', 'ctr'],
         sample_size=min(control_total, treatment_total),
-        n_simulations=5000  # 减少模拟次数以提高速度
+        alpha=alpha,
+        n_simulations=n_simulations
     )
     
     # 效应量计算
@@ -157,11 +298,35 @@ def comprehensive_analysis(df):
         'sample_sizes': {
             'control': control_total,
             'treatment': treatment_total
-        }
+        },
+        'alpha': alpha
     }
     
+    if bayesian:
+        comprehensive_results['bayesian'] = bayesian_analysis(counts, credible_level=1 - alpha)
+    
     return comprehensive_results
 
+def comprehensive_analysis(df, ci_method='wald', alpha=0.05, metric='clicked', bayesian=True):
+    """执行全面的统计分析"""
+    return analyze_counts(aggregate_counts(df, metric), ci_method=ci_method, alpha=alpha, bayesian=bayesian)
+
+def streaming_analysis(source, output_path=None, chunksize=1000000, ci_method='wald', alpha=0.05,
+                       metric='clicked', bayesian=True):
+    """
+    流式执行全面的统计分析（适用于大于内存的数据）
+    
+    ci_method、alpha、metric 和 bayesian 的含义与 comprehensive_analysis 相同，
+    相同参数下结果与对完整数据调用 comprehensive_analysis 相同。
+    """
+    results = analyze_counts(stream_counts(source, chunksize, metric), ci_method=ci_method, alpha=alpha,
+                             bayesian=bayesian)
+    
+    if output_path:
+        save_statistical_results(results, output_path)
+    
+    return results
+
 def save_statistical_results(results, output_path):
     """保存统计结果到JSON文件"""
     with open(output_path, 'w') as f:
@@ -169,7 +334,7 @@ def save_statistical_results(results, output_path):
 
 if __name__ == "__main__":
     # 加载数据
-    df = load_data('../data/processed/ab_test_clean_data.csv')
+    df = load_data('../data/processed/ab_test_clean_data.csv', columns=['group', 'clicked'])
     
     # 执行分析
     results = comprehensive_analysis(df)
@@ -182,3 +347,4 @@ if __name__ == "__main__":
     print(f"实验组CTR: {results['click_rates']['ctr']['treatment']:.3f}")
     print(f"P值: {results['chi_square_test']['p_value']:.6f}")
     print(f"统计功效: {results['power_analysis']['power']:.3f}")
+    print(f"实验组优于控制组的概率: {results['bayesian']['prob_treatment_beats_control']:.3f}")
@@ -0,0 +1,158 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# A/B曝光数据的紧凑结构，贯穿数据生成、保存和加载。每行内存预算:
+#   user_id    int32            4 字节
+#   timestamp  datetime64[ns]   8 字节
+#   group      category         1 字节（编码，类别表只存一份）
+#   clicked    int8             1 字节
+# （用户ID超出 int32 范围时改用 int64，见 user_id_dtype）
+# 原始数据约14字节/行，1亿行约1.4GB；处理后数据另含 date (datetime64[ns], 8字节)
+# 和 hour (int8, 1字节)，约23字节/行。分析阶段只加载 group 和 clicked，仅2字节/行。
+# 分组的类别表由数据推断（多实验组的数据不会丢失未知分组），模拟数据固定为 GROUP_DTYPE。
+GROUP_DTYPE = pd.CategoricalDtype(['control', 'treatment'])
+AB_DTYPES = {
+    'user_id': 'int32',
+    'timestamp': 'datetime64[ns]',
+    'group': 'category',
+    'clicked': 'int8',
+    'date': 'datetime64[ns]',
+    'hour': 'int8'
+}
+
+def user_id_dtype(max_user_id):
+    """能容纳 [0, max_user_id] 的用户ID类型: 默认 int32，超出范围时为 int64（不会溢出回绕）"""
+    return 'int32' if max_user_id <= np.iinfo(np.int32).max else 'int64'
+
+def apply_ab_schema(df):
+    """将A/B数据的列转换为紧凑类型（兼容旧数据中 'user_000123' 形式的用户ID）"""
+    for column, dtype in AB_DTYPES.items():
+        if column not in df.columns or df[column].dtype == dtype:
+            continue
+        values = df[column]
+        if column == 'user_id':
+            if not pd.api.types.is_numeric_dtype(values):
+                values = values.str.removeprefix('user_').astype('int64')
+            dtype = user_id_dtype(values.max()) if len(values) else dtype
+        elif dtype == 'datetime64[ns]':
+            values = pd.to_datetime(values)
+        df[column] = values.astype(dtype)
+    return df
+
+# 按文件扩展名识别存储格式
+FORMATS = {
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+    '.feather': 'feather',
+    '.arrow': 'feather'
+}
+
+def detect_format(path):
+    """根据扩展名判断文件格式（csv / parquet / feather）"""
+    ext = os.path.splitext(str(path))[1].lower()
+    if ext not in FORMATS:
+        raise ValueError(f"不支持的文件格式: {path}")
+    return FORMATS[ext]
+
+def write_frame(df, path):
+    """按扩展名对应的格式保存DataFrame，列式格式保留列类型"""
+    file_format = detect_format(path)
+    if file_format == 'csv':
+        df.to_csv(path, index=False)
+    elif file_format == 'parquet':
+        df.to_parquet(path, index=False)
+    else:
+        df.reset_index(drop=True).to_feather(path)
+
+def read_frame(path, columns=None):
+    """
+    按扩展名对应的格式读取DataFrame
+
+    参数:
+    columns: 只读取指定的列；列式格式只会读取这些列的数据
+    """
+    file_format = detect_format(path)
+    if file_format == 'csv':
+        return pd.read_csv(path, usecols=columns)
+    if file_format == 'parquet':
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_feather(path, columns=columns)
+
+def read_columns(path):
+    """只读取文件的列名，不加载数据"""
+    file_format = detect_format(path)
+    if file_format == 'csv':
+        return list(pd.read_csv(path, nrows=0).columns)
+    import pyarrow as pa
+    if file_format == 'parquet':
+        import pyarrow.parquet as pq
+        return list(pq.read_schema(path).names)
+    with pa.memory_map(str(path)) as source:
+        return list(pa.ipc.open_file(source).schema.names)
+
+def iter_frames(path, columns=None, chunksize=1000000):
+    """分块读取文件，峰值内存只与分块大小有关"""
+    file_format = detect_format(path)
+    if file_format == 'csv':
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunksize)
+    elif file_format == 'parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        import pyarrow as pa
+        with pa.memory_map(str(path)) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                if columns is not None:
+                    batch = batch.select(columns)
+                yield batch.to_pandas()
+
+class FrameAppender:
+    """
+    将多个DataFrame分块逐个追加写入同一个文件
+
+    CSV直接追加；Parquet写为多个row group；Feather写为Arrow IPC文件的多个record batch。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file_format = detect_format(path)
+        self.writer = None
+        self.sink = None
+        self.rows = 0
+        if os.path.exists(path):
+            os.remove(path)
+
+    def append(self, df):
+        """追加一个分块"""
+        if self.file_format == 'csv':
+            df.to_csv(self.path, mode='a', header=self.rows == 0, index=False)
+        else:
+            import pyarrow as pa
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self.writer is None:
+                if self.file_format == 'parquet':
+                    import pyarrow.parquet as pq
+                    self.writer = pq.ParquetWriter(self.path, table.schema)
+                else:
+                    self.sink = pa.OSFile(str(self.path), 'wb')
+                    self.writer = pa.ipc.new_file(self.sink, table.schema)
+            self.writer.write_table(table)
+        self.rows += len(df)
+
+    def close(self):
+        """结束写入"""
+        if self.writer is not None:
+            self.writer.close()
+        if self.sink is not None:
+            self.sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -1,8 +1,12 @@
+import os
 import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
 import numpy as np
-from statistical_analysis import load_data, calculate_click_rates, calculate_confidence_interval
+from statistical_analysis import (load_data, aggregate_counts, click_rates_from_counts,
+                                  calculate_confidence_interval)
+from power_curve import compute_power_curve, observed_power_curve
+from rendering import figure_spec, render_figures
 
 def setup_plot_style():
     """设置绘图样式"""
@@ -11,11 +15,18 @@ def setup_plot_style():
     plt.rcParams['font.sans-serif'] = ['SimHei', 'Arial']
     plt.rcParams['axes.unicode_minus'] = False
 
-def plot_click_rates_comparison(df, save_path=None):
-    """绘制点击率对比图"""
+def finish_figure(show=False):
+    """交互模式下显示图表，否则直接关闭，避免批量运行时阻塞"""
+    if show:
+        plt.show()
+    else:
+        plt.close()
+
+def plot_click_rates_comparison(counts, save_path=None, show=False):
+    """绘制点击率对比图（counts 为 aggregate_counts 的结果）"""
     setup_plot_style()
     
-    click_rates = calculate_click_rates(df)
+    click_rates = click_rates_from_counts(counts)
     
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
     
@@ -52,24 +63,16 @@ def plot_click_rates_comparison(df, save_path=None):
         plt.savefig(save_path, dpi=300, bbox_inches='tight')
         print(f"点击率对比图已保存至: {save_path}")
     
-    plt.show()
+    finish_figure(show)
 
-def plot_confidence_intervals(df, save_path=None):
-    """绘制置信区间图"""
+def plot_confidence_intervals(counts, save_path=None, show=False):
+    """绘制置信区间图（counts 为 aggregate_counts 的结果）"""
     setup_plot_style()
     
     # 计算置信区间
-    control_data = df[df['group'] == 'control']['clicked']
-    treatment_data = df[df['group'] == 'treatment']['clicked']
-    
-    control_clicks = control_data.sum()
-    control_total = len(control_data)
-    treatment_clicks = treatment_data.sum()
-    treatment_total = len(treatment_data)
-    
     ci_results = calculate_confidence_interval(
-        control_clicks, control_total, 
-        treatment_clicks, treatment_total
+        counts.loc['control', 'clicks'], counts.loc['control', 'count'],
+        counts.loc['treatment', 'clicks'], counts.loc['treatment', 'count']
     )
     
     fig, ax = plt.subplots(figsize=(10, 6))
@@ -112,9 +115,9 @@ def plot_confidence_intervals(df, save_path=None):
         plt.savefig(save_path, dpi=300, bbox_inches='tight')
         print(f"置信区间图已保存至: {save_path}")
     
-    plt.show()
+    finish_figure(show)
 
-def plot_power_analysis(sample_sizes, power_levels, save_path=None):
+def plot_power_analysis(sample_sizes, power_levels, save_path=None, show=False):
     """绘制统计功效分析图"""
     setup_plot_style()
     
@@ -139,24 +142,40 @@ def plot_power_analysis(sample_sizes, power_levels, save_path=None):
         plt.savefig(save_path, dpi=300, bbox_inches='tight')
         print(f"功效分析图已保存至: {save_path}")
     
-    plt.show()
+    finish_figure(show)
 
-def create_sample_power_curve():
-    """创建样本功效曲线示例数据"""
-    # 这里使用简化版的功效计算
-    sample_sizes = [500, 1000, 2000, 5000, 8000, 10000, 15000, 20000]
-    power_levels = [0.25, 0.45, 0.68, 0.89, 0.95, 0.97, 0.99, 0.995]
+def create_power_curve(control_ctr, treatment_ctr, alpha=0.05, method='analytic'):
+    """根据观测到的点击率计算样本量-功效曲线（结果缓存在磁盘上）"""
+    curve = compute_power_curve(control_ctr, treatment_ctr, alpha=alpha, method=method)
+    return observed_power_curve(curve)
+
+def render_all_figures(counts, figures_dir, n_jobs=None, force=False):
+    """
+    并行渲染全部图表，汇总数据未变化的图表会被跳过
+    
+    参数:
+    counts: aggregate_counts 的结果
+    figures_dir: 图表输出目录
+    force: 忽略渲染缓存全部重新渲染
+    """
+    click_rates = click_rates_from_counts(counts)
+    sample_sizes, power_levels = create_power_curve(
+        click_rates.loc['control', 'ctr'],
+        click_rates.loc['treatment', 'ctr']
+    )
     
-    return sample_sizes, power_levels
+    specs = [
+        figure_spec(plot_click_rates_comparison, (counts,), os.path.join(figures_dir, 'click_rates_comparison.png')),
+        figure_spec(plot_confidence_intervals, (counts,), os.path.join(figures_dir, 'confidence_intervals.png')),
+        figure_spec(plot_power_analysis, (sample_sizes, power_levels), os.path.join(figures_dir, 'power_analysis.png'))
+    ]
+    return render_figures(specs, figures_dir, n_jobs=n_jobs, force=force)
 
 if __name__ == "__main__":
     # 加载数据
-    df = load_data('../data/processed/ab_test_clean_data.csv')
+    df = load_data('../data/processed/ab_test_clean_data.csv', columns=['group', 'clicked'])
+    counts = aggregate_counts(df)
     
     # 生成所有图表
-    plot_click_rates_comparison(df, '../results/figures/click_rates_comparison.png')
-    plot_confidence_intervals(df, '../results/figures/confidence_intervals.png')
-    
-    # 生成功效分析图
-    sample_sizes, power_levels = create_sample_power_curve()
-    plot_power_analysis(sample_sizes, power_levels, '../results/figures/power_analysis.png')
+    result = render_all_figures(counts, '../results/figures')
+    print(f"渲染 {len(result['rendered'])} 张图表，跳过 {len(result['skipped'])} 张未变化的图表")
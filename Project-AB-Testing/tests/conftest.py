@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 源码以脚本方式组织（模块之间直接 import），测试时把 src 加入模块搜索路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
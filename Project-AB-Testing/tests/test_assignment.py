@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from assignment import Experiment, assignment_mismatches
+
+USER_IDS = list(range(2000))
+
+@pytest.mark.parametrize('user_ids', [
+    np.array(USER_IDS),
+    np.array(USER_IDS, dtype=object),
+    pd.Series(USER_IDS, dtype='Int64').to_numpy(),
+    pd.Series(USER_IDS + [None], dtype='Int64').to_numpy()[:-1],
+], ids=['int64', 'object', 'Int64', 'Int64-with-NA'])
+def test_bulk_assignment_matches_single_user(user_ids):
+    experiment = Experiment('start_button_color')
+    expected = [experiment.assign(user_id) for user_id in USER_IDS]
+    assert list(experiment.assign_many(user_ids)) == expected
+
+def test_no_false_mismatches_for_nullable_ids():
+    experiment = Experiment('start_button_color')
+    df = pd.DataFrame({
+        'user_id': pd.array(USER_IDS, dtype='Int64'),
+        'group': [experiment.assign(user_id) for user_id in USER_IDS]
+    })
+    assert assignment_mismatches(df, experiment) == 0
+
+def test_missing_user_id_raises():
+    with pytest.raises(ValueError):
+        Experiment('start_button_color').assign_codes(pd.Series([1, None], dtype='Int64').to_numpy())
@@ -0,0 +1,35 @@
+import importlib
+import sys
+
+import rendering
+
+PLOT_MODULE = '''
+import matplotlib.pyplot as plt
+
+def plot_bars(values, save_path=None):
+    plt.figure(figsize={figsize})
+    plt.bar(range(len(values)), values)
+    plt.savefig(save_path)
+'''
+
+def _load_plot_module(directory, figsize):
+    (directory / 'render_test_plots.py').write_text(PLOT_MODULE.format(figsize=figsize), encoding='utf-8')
+    sys.modules.pop('render_test_plots', None)
+    importlib.invalidate_caches()
+    return importlib.import_module('render_test_plots')
+
+def test_editing_plot_code_triggers_rerender(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    path = str(tmp_path / 'bars.png')
+
+    module = _load_plot_module(tmp_path, (4, 3))
+    specs = [rendering.figure_spec(module.plot_bars, ([1, 2, 3],), path)]
+    assert rendering.render_figures(specs, str(tmp_path), n_jobs=1)['rendered'] == [path]
+    assert rendering.render_figures(specs, str(tmp_path), n_jobs=1)['skipped'] == [path]
+
+    # 数据不变、只修改绘图代码
+    module = _load_plot_module(tmp_path, (6, 3))
+    specs = [rendering.figure_spec(module.plot_bars, ([1, 2, 3],), path)]
+    assert rendering.render_figures(specs, str(tmp_path), n_jobs=1)['rendered'] == [path]
+
+    sys.modules.pop('render_test_plots', None)
@@ -0,0 +1,170 @@
+# aggregation.py
+import math
+import numpy as np
+import pandas as pd
+from sketches import DailySketches, MAX_PRECISION, precision_for_error, hash_values, grouped_registers, estimate
+
+# 分析用到的字符串列，加载时直接解析为分类类型（只编码一次）
+CATEGORICAL_COLUMNS = ['user_id', 'book_id', 'action_type', 'category', 'date']
+
+# 去重计数使用 (分组, 取值) 的布尔矩阵，超过该大小时改用排序去重
+DENSE_DISTINCT_LIMIT = 50_000_000
+
+# 每个用户一个草图时的最高精度（2^8 = 256 字节/用户，相对误差约6.5%），
+# 100万用户约256MB；更高的精度会比精确去重占用更多内存
+USER_SKETCH_MAX_PRECISION = 8
+USER_SKETCH_MIN_ERROR = 1.04 / math.sqrt(2 ** USER_SKETCH_MAX_PRECISION)
+
+def encode(values):
+    """
+    把一列转换为整数编码和类别表
+
+    分类列直接复用已有编码（类别表无序时重新映射为排序后的编码），其余列按排序后的取值编码。
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes, categories = values.cat.codes.to_numpy(), values.cat.categories
+        if not categories.is_monotonic_increasing:
+            order = categories.argsort()
+            rank = np.empty(len(order), dtype=codes.dtype)
+            rank[order] = np.arange(len(order))
+            codes, categories = rank[codes], categories[order]
+        return codes, categories
+    codes, uniques = pd.factorize(values, sort=True)
+    return codes, pd.Index(uniques)
+
+def count_distinct(group_codes, n_groups, value_codes, n_values):
+    """每个分组中不同取值的个数（例如每天的活跃用户数）"""
+    if n_groups * n_values <= DENSE_DISTINCT_LIMIT:
+        seen = np.zeros((n_groups, n_values), dtype=bool)
+        seen[group_codes, value_codes] = True
+        return seen.sum(axis=1)
+    pairs = np.unique(group_codes.astype(np.int64) * n_values + value_codes)
+    return np.bincount(pairs // n_values, minlength=n_groups)
+
+class EventAggregates:
+    """
+    行为数据的聚合结果
+
+    由 aggregate_events 一次编码、一次扫描得到，包含各项分析和图表需要的全部统计量，
+    以 pandas 对象的形式提供给分析函数。
+    """
+
+    def __init__(self, n_events, dau, hourly_activity, category_counts, category_read_time_sum,
+                 action_counts, user_stats, daily_user_sketches=None):
+        self.n_events = n_events
+        self.dau = dau
+        self.hourly_activity = hourly_activity
+        self.category_counts = category_counts
+        self.category_read_time_sum = category_read_time_sum
+        self.action_counts = action_counts
+        self.user_stats = user_stats
+        # 近似模式下每天的活跃用户草图（DailySketches），可持久化并用于计算 WAU / MAU
+        self.daily_user_sketches = daily_user_sketches
+
+    @property
+    def category_popularity(self):
+        """各类别的事件数（降序）"""
+        return self.category_counts.sort_values(ascending=False, kind='stable')
+
+    @property
+    def category_read_time(self):
+        """各类别的平均阅读时长（降序）"""
+        mean = self.category_read_time_sum / self.category_counts
+        return mean.sort_values(ascending=False, kind='stable')
+
+    @property
+    def action_distribution(self):
+        """各行为类型的事件数（降序）"""
+        return self.action_counts.sort_values(ascending=False, kind='stable')
+
+    @property
+    def user_activity(self):
+        """每个用户的事件数、总阅读时长和阅读书籍数（按总阅读时长降序）"""
+        return self.user_stats.sort_values('total_read_time', ascending=False, kind='stable')
+
+    @property
+    def user_total_read_time(self):
+        """每个用户的总阅读时长（降序）"""
+        return self.user_activity['total_read_time']
+
+def sketch_distinct(group_codes, n_groups, value_codes, values, error, max_precision=MAX_PRECISION):
+    """
+    用 HyperLogLog 估计每个分组中不同取值的个数
+
+    只对类别表做哈希，再按编码取得每行的哈希值。
+    寄存器矩阵占用 n_groups x 2^precision 字节，精度不超过 max_precision。
+
+    返回:
+    (估计值数组, 寄存器矩阵, 精度)
+    """
+    precision = precision_for_error(error, max_precision)
+    hashes = hash_values(pd.Series(values))[value_codes]
+    registers = grouped_registers(group_codes, n_groups, hashes, precision)
+    return estimate(registers), registers, precision
+
+def aggregate_events(df, dau_error=None, unique_books_error=None):
+    """
+    单次扫描计算分析所需的全部聚合
+
+    各列先转换为整数编码，之后的计数、求和与去重计数都是编码数组上的 bincount，
+    不再对原始数据重复 groupby / value_counts。
+
+    参数:
+    df: 清洗后的行为数据，需包含 user_id、book_id、date、hour、category、action_type、read_time
+    dau_error: 给出时用 HyperLogLog（该相对误差）估计DAU并保留每日草图，否则精确计数
+    unique_books_error: 给出时用 HyperLogLog 估计每个用户阅读的书籍数，否则精确计数；
+                        每个用户一个草图，精度不超过 USER_SKETCH_MAX_PRECISION，
+                        所需精度超过该上限时抛出 ValueError
+
+    返回:
+    EventAggregates
+    """
+    if unique_books_error is not None and precision_for_error(unique_books_error) > USER_SKETCH_MAX_PRECISION:
+        raise ValueError(f"unique_books_error={unique_books_error} is below the per-user sketch limit "
+                         f"of {USER_SKETCH_MIN_ERROR:.3f} (precision {USER_SKETCH_MAX_PRECISION})")
+
+    user_codes, users = encode(df['user_id'])
+    book_codes, books = encode(df['book_id'])
+    date_codes, dates = encode(df['date'])
+    category_codes, categories = encode(df['category'])
+    action_codes, actions = encode(df['action_type'])
+    hours = df['hour'].to_numpy()
+    read_time = df['read_time'].to_numpy(dtype=np.float64)
+
+    n_users = len(users)
+    hour_counts = np.bincount(hours, minlength=24)
+    present_hours = np.flatnonzero(hour_counts)
+
+    if unique_books_error is None:
+        unique_books = count_distinct(user_codes, n_users, book_codes, len(books))
+    else:
+        unique_books = sketch_distinct(user_codes, n_users, book_codes, books, unique_books_error,
+                                       max_precision=USER_SKETCH_MAX_PRECISION)[0]
+
+    daily_user_sketches = None
+    if dau_error is None:
+        dau = count_distinct(date_codes, len(dates), user_codes, n_users)
+    else:
+        dau, registers, precision = sketch_distinct(date_codes, len(dates), user_codes, users, dau_error)
+        daily_user_sketches = DailySketches.from_registers(dates, registers, precision)
+
+    user_read_time = np.bincount(user_codes, weights=read_time, minlength=n_users)
+    user_stats = pd.DataFrame({
+        'total_events': np.bincount(user_codes, minlength=n_users),
+        'total_read_time': user_read_time.astype(df['read_time'].dtype),
+        'unique_books': unique_books
+    }, index=pd.Index(users, name='user_id'))
+
+    return EventAggregates(
+        n_events=len(df),
+        dau=pd.Series(dau, index=pd.Index(dates, name='date'), name='user_id'),
+        hourly_activity=pd.Series(hour_counts[present_hours], index=pd.Index(present_hours, name='hour')),
+        category_counts=pd.Series(np.bincount(category_codes, minlength=len(categories)),
+                                  index=pd.Index(categories, name='category'), name='count'),
+        category_read_time_sum=pd.Series(np.bincount(category_codes, weights=read_time, minlength=len(categories)),
+                                         index=pd.Index(categories, name='category'), name='read_time'),
+        action_counts=pd.Series(np.bincount(action_codes, minlength=len(actions)),
+                                index=pd.Index(actions, name='action_type'), name='count'),
+        user_stats=user_stats,
+        daily_user_sketches=daily_user_sketches
+    )
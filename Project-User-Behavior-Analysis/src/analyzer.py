@@ -5,6 +5,11 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 from matplotlib import font_manager
 import os
+from rendering import figure_spec, render_figures
+from aggregation import EventAggregates, aggregate_events, CATEGORICAL_COLUMNS, USER_SKETCH_MIN_ERROR
+from sketches import DailySketches
+from rollups import RollupStore
+from instrumentation import stage
 
 # 设置中文字体
 plt.rcParams['font.sans-serif'] = ['SimHei']
@@ -12,9 +17,9 @@ plt.rcParams['axes.unicode_minus'] = False
 sns.set_style("whitegrid")
 
 def load_clean_data(filepath):
-    """加载清洗后的数据"""
+    """加载清洗后的数据（字符串列解析为分类类型，聚合时直接使用其编码）"""
     print(f"Loading cleaned data from {filepath}...")
-    df = pd.read_csv(filepath, parse_dates=['timestamp'])
+    df = pd.read_csv(filepath, parse_dates=['timestamp'], dtype={column: 'category' for column in CATEGORICAL_COLUMNS})
     return df
 
 def ensure_figures_dir():
@@ -23,88 +28,150 @@ def ensure_figures_dir():
     os.makedirs(figures_dir, exist_ok=True)
     return figures_dir
 
-def analyze_user_activity(df, figures_dir):
-    """分析用户活跃度"""
-    print("Analyzing user activity...")
-    
-    # 每日活跃用户数 (DAU)
-    dau = df.groupby('date')['user_id'].nunique()
+def plot_dau_trend(dau, save_path):
+    """绘制每日活跃用户趋势图"""
     plt.figure(figsize=(12, 6))
     dau.plot(kind='line', title='Daily Active Users (DAU) Trend', color='orange', marker='o')
     plt.xlabel('Date')
     plt.ylabel('Number of Active Users')
     plt.xticks(rotation=45)
     plt.tight_layout()
-    plt.savefig(f'{figures_dir}dau_trend.png', dpi=300, bbox_inches='tight')
+    plt.savefig(save_path, dpi=300, bbox_inches='tight')
     plt.close()
-    
-    # 用户每日阅读时段分布
-    hourly_activity = df.groupby('hour').size()
+
+def plot_hourly_activity(hourly_activity, save_path):
+    """绘制每日阅读时段分布图"""
     plt.figure(figsize=(10, 6))
     hourly_activity.plot(kind='bar', color='skyblue', title='User Activity by Hour of Day')
     plt.xlabel('Hour of Day')
     plt.ylabel('Number of Events')
     plt.tight_layout()
-    plt.savefig(f'{figures_dir}hourly_activity.png', dpi=300, bbox_inches='tight')
+    plt.savefig(save_path, dpi=300, bbox_inches='tight')
     plt.close()
-    
-    return {
-        'avg_dau': dau.mean(),
-        'peak_hour': hourly_activity.idxmax()
-    }
 
-def analyze_content_preference(df, figures_dir):
-    """分析内容偏好"""
-    print("Analyzing content preference...")
-    
-    # 最受欢迎的书籍类别
-    category_popularity = df['category'].value_counts()
+def plot_category_popularity(category_popularity, save_path):
+    """绘制书籍类别热度图"""
     plt.figure(figsize=(10, 6))
     category_popularity.plot(kind='bar', color='lightgreen', title='Popularity of Book Categories')
     plt.xlabel('Book Category')
     plt.ylabel('Number of Events')
     plt.xticks(rotation=45)
     plt.tight_layout()
-    plt.savefig(f'{figures_dir}category_popularity.png', dpi=300, bbox_inches='tight')
+    plt.savefig(save_path, dpi=300, bbox_inches='tight')
     plt.close()
-    
-    # 不同类别的平均阅读时长
-    category_read_time = df.groupby('category')['read_time'].mean().sort_values(ascending=False)
+
+def plot_category_read_time(category_read_time, save_path):
+    """绘制各类别平均阅读时长图"""
     plt.figure(figsize=(10, 6))
     category_read_time.plot(kind='bar', color='salmon', title='Average Reading Time by Category (minutes)')
     plt.xlabel('Book Category')
     plt.ylabel('Average Reading Time (minutes)')
     plt.xticks(rotation=45)
     plt.tight_layout()
-    plt.savefig(f'{figures_dir}category_read_time.png', dpi=300, bbox_inches='tight')
+    plt.savefig(save_path, dpi=300, bbox_inches='tight')
     plt.close()
+
+def plot_user_read_time_dist(user_total_read_time, save_path):
+    """绘制用户阅读总时长分布图"""
+    plt.figure(figsize=(10, 6))
+    user_total_read_time.hist(bins=50, color='purple', alpha=0.7)
+    plt.title('Distribution of Total Reading Time per User')
+    plt.xlabel('Total Reading Time (minutes)')
+    plt.ylabel('Number of Users')
+    plt.tight_layout()
+    plt.savefig(save_path, dpi=300, bbox_inches='tight')
+    plt.close()
+
+def plot_action_types(action_counts, save_path):
+    """绘制行为类型分布饼图"""
+    plt.figure(figsize=(8, 8))
+    plt.pie(action_counts, labels=action_counts.index, autopct='%1.1f%%', startangle=90, 
+            colors=['gold', 'lightcoral', 'lightskyblue'])
+    plt.title('Distribution of Action Types')
+    plt.savefig(save_path, dpi=300, bbox_inches='tight')
+    plt.close()
+
+def _collect_figures(specs, figures_dir, figures):
+    """收集图表描述；未传入 figures 列表时立即渲染"""
+    if figures is None:
+        render_figures(specs, figures_dir)
+    else:
+        figures.extend(specs)
+
+def _as_aggregates(data):
+    """分析函数既接受 aggregate_events 的结果，也接受明细数据"""
+    return data if isinstance(data, EventAggregates) else aggregate_events(data)
+
+def analyze_user_activity(data, figures_dir, figures=None):
+    """
+    分析用户活跃度
+    
+    data 为 aggregate_events 的结果（传入明细数据时先做聚合）。
+    图表只生成描述（figure_spec），传入 figures 列表时追加到列表中统一渲染，否则立即渲染。
+    """
+    print("Analyzing user activity...")
+    agg = _as_aggregates(data)
+    
+    # 每日活跃用户数 (DAU)
+    dau = agg.dau
+    
+    # 用户每日阅读时段分布
+    hourly_activity = agg.hourly_activity
+    
+    _collect_figures([
+        figure_spec(plot_dau_trend, (dau,), f'{figures_dir}dau_trend.png'),
+        figure_spec(plot_hourly_activity, (hourly_activity,), f'{figures_dir}hourly_activity.png')
+    ], figures_dir, figures)
+    
+    insights = {
+        'avg_dau': dau.mean(),
+        'peak_hour': hourly_activity.idxmax()
+    }
+    
+    # 近似模式下由每日草图的并集得到最近7天和30天的活跃用户数
+    sketches = agg.daily_user_sketches
+    if sketches is not None:
+        dates = sketches.dates()
+        insights['wau'] = sketches.union_count(dates[-7:])
+        insights['mau'] = sketches.union_count(dates[-30:])
+    
+    return insights
+
+def analyze_content_preference(data, figures_dir, figures=None):
+    """分析内容偏好"""
+    print("Analyzing content preference...")
+    agg = _as_aggregates(data)
+    
+    # 最受欢迎的书籍类别
+    category_popularity = agg.category_popularity
+    
+    # 不同类别的平均阅读时长
+    category_read_time = agg.category_read_time
+    
+    _collect_figures([
+        figure_spec(plot_category_popularity, (category_popularity,), f'{figures_dir}category_popularity.png'),
+        figure_spec(plot_category_read_time, (category_read_time,), f'{figures_dir}category_read_time.png')
+    ], figures_dir, figures)
     
     return {
         'most_popular_category': category_popularity.index[0],
         'category_longest_read': category_read_time.index[0]
     }
 
-def analyze_user_value(df, figures_dir):
+def analyze_user_value(data, figures_dir, figures=None):
     """分析用户价值"""
     print("Analyzing user value...")
+    agg = _as_aggregates(data)
     
     # 用户阅读总时长分布
-    user_total_read_time = df.groupby('user_id')['read_time'].sum().sort_values(ascending=False)
-    plt.figure(figsize=(10, 6))
-    user_total_read_time.hist(bins=50, color='purple', alpha=0.7)
-    plt.title('Distribution of Total Reading Time per User')
-    plt.xlabel('Total Reading Time (minutes)')
-    plt.ylabel('Number of Users')
-    plt.tight_layout()
-    plt.savefig(f'{figures_dir}user_read_time_dist.png', dpi=300, bbox_inches='tight')
-    plt.close()
+    user_total_read_time = agg.user_total_read_time
+    
+    _collect_figures([
+        figure_spec(plot_user_read_time_dist, (user_total_read_time,), f'{figures_dir}user_read_time_dist.png')
+    ], figures_dir, figures)
     
     # 用户分层 (基于阅读行为)
-    user_activity = df.groupby('user_id').agg(
-        total_events=('user_id', 'count'),
-        total_read_time=('read_time', 'sum'),
-        unique_books=('book_id', 'nunique')
-    ).sort_values('total_read_time', ascending=False)
+    user_activity = agg.user_activity.copy()
     
     # 定义用户分层
     user_activity['user_tier'] = pd.qcut(user_activity['total_read_time'], q=3, labels=['Low', 'Medium', 'High'])
@@ -118,17 +185,16 @@ def analyze_user_value(df, figures_dir):
         'tier_distribution': tier_distribution.to_dict()
     }
 
-def analyze_action_types(df, figures_dir):
+def analyze_action_types(data, figures_dir, figures=None):
     """分析行为类型"""
     print("Analyzing action types...")
+    agg = _as_aggregates(data)
     
-    action_counts = df['action_type'].value_counts()
-    plt.figure(figsize=(8, 8))
-    plt.pie(action_counts, labels=action_counts.index, autopct='%1.1f%%', startangle=90, 
-            colors=['gold', 'lightcoral', 'lightskyblue'])
-    plt.title('Distribution of Action Types')
-    plt.savefig(f'{figures_dir}action_type_pie.png', dpi=300, bbox_inches='tight')
-    plt.close()
+    action_counts = agg.action_distribution
+    
+    _collect_figures([
+        figure_spec(plot_action_types, (action_counts,), f'{figures_dir}action_type_pie.png')
+    ], figures_dir, figures)
     
     return {
         'action_distribution': action_counts.to_dict()
@@ -158,23 +224,98 @@ def generate_report(insights):
     
     print(f"\n完整报告已保存至: {report_path}")
 
-if __name__ == "__main__":
-    # 加载清洗后的数据
-    input_path = '../data/user_behavior_data_clean.csv'
-    df = load_clean_data(input_path)
+def run_analysis(df, figures_dir, sketch_error=None, sketch_dir=None, rollup_dir=None, user_sketch_error=None):
+    """
+    对清洗后的数据执行全部分析、渲染图表并生成报告
+
+    参数:
+    sketch_error: 给出时用 HyperLogLog 估计DAU
+    sketch_dir: 与该目录中已保存的每日草图合并（需要 sketch_error）
+    rollup_dir: 只为新出现或内容变化的日期计算汇总，报告由每日汇总组装
+    user_sketch_error: 给出时用 HyperLogLog 估计每个用户阅读的书籍数（每个用户一个低精度草图）
+
+    返回:
+    各项分析结果
+    """
+    if sketch_dir and sketch_error is None:
+        raise ValueError("sketch_dir requires sketch_error")
+    if rollup_dir and (sketch_error is not None or user_sketch_error is not None):
+        raise ValueError("rollup_dir cannot be combined with sketch_error or user_sketch_error")
+
+    # 一次扫描得到全部聚合，各项分析只使用聚合结果
+    if rollup_dir:
+        # 只为新出现的日期计算汇总，报告由这些数据日期的汇总组装
+        store = RollupStore(rollup_dir)
+        with stage('ingest_rollups', rows=len(df)) as span:
+            written = store.ingest(df)
+            span.set_rows(len(written))
+        print(f"Rolled up {len(written)} new or changed dates into {rollup_dir}")
+        with stage('assemble_rollups'):
+            agg = store.assemble(sorted(df['date'].astype(str).unique()))
+    else:
+        with stage('aggregate_events', rows=len(df)):
+            agg = aggregate_events(df, dau_error=sketch_error, unique_books_error=user_sketch_error)
     
-    # 确保图表目录存在
-    figures_dir = ensure_figures_dir()
+    # 与已保存的每日草图合并，WAU / MAU 覆盖全部历史日期
+    if sketch_dir:
+        if os.path.isdir(sketch_dir):
+            store = DailySketches.load(sketch_dir)
+        else:
+            store = DailySketches(agg.daily_user_sketches.precision)
+        agg.daily_user_sketches = store.update(agg.daily_user_sketches)
+        store.save(sketch_dir)
     
-    # 执行各项分析
+    # 执行各项分析，图表描述收集后统一并行渲染
     insights = {}
+    figures = []
     
-    insights['user_activity'] = analyze_user_activity(df, figures_dir)
-    insights['content_preference'] = analyze_content_preference(df, figures_dir)
-    insights['user_value'] = analyze_user_value(df, figures_dir)
-    insights['action_types'] = analyze_action_types(df, figures_dir)
+    with stage('analyze_user_activity'):
+        insights['user_activity'] = analyze_user_activity(agg, figures_dir, figures)
+    with stage('analyze_content_preference'):
+        insights['content_preference'] = analyze_content_preference(agg, figures_dir, figures)
+    with stage('analyze_user_value'):
+        insights['user_value'] = analyze_user_value(agg, figures_dir, figures)
+    with stage('analyze_action_types'):
+        insights['action_types'] = analyze_action_types(agg, figures_dir, figures)
+    
+    with stage('render_figures', rows=len(figures)):
+        rendered = render_figures(figures, figures_dir)
+    print(f"Rendered {len(rendered['rendered'])} figures, skipped {len(rendered['skipped'])} unchanged.")
     
     # 生成并显示报告
     generate_report(insights)
+    return insights
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Analyze cleaned user behavior data')
+    parser.add_argument('--sketch-error', type=float,
+                        help='Estimate DAU with HyperLogLog at this relative error')
+    parser.add_argument('--user-sketch-error', type=float,
+                        help='Estimate per-user unique books with HyperLogLog at this relative error '
+                             f'(one small sketch per user, must be at least {USER_SKETCH_MIN_ERROR:.3f})')
+    parser.add_argument('--sketch-dir', metavar='DIR',
+                        help='Merge the daily user sketches into DIR (requires --sketch-error)')
+    parser.add_argument('--rollup-dir', metavar='DIR',
+                        help='Only summarize dates that are new or changed in the daily rollup store in DIR and report from the rollups')
+    args = parser.parse_args()
+    if args.sketch_dir and args.sketch_error is None:
+        parser.error('--sketch-dir requires --sketch-error')
+    if args.user_sketch_error is not None and args.user_sketch_error < USER_SKETCH_MIN_ERROR:
+        parser.error(f'--user-sketch-error must be at least {USER_SKETCH_MIN_ERROR:.3f}')
+    if args.rollup_dir and (args.sketch_error is not None or args.user_sketch_error is not None):
+        parser.error('--rollup-dir cannot be combined with --sketch-error or --user-sketch-error')
+    
+    # 加载清洗后的数据
+    input_path = '../data/user_behavior_data_clean.csv'
+    with stage('load_clean_data') as span:
+        df = load_clean_data(input_path)
+        span.set_rows(len(df))
+    
+    # 确保图表目录存在
+    figures_dir = ensure_figures_dir()
+    
+    run_analysis(df, figures_dir, args.sketch_error, args.sketch_dir, args.rollup_dir, args.user_sketch_error)
     
     print("\nAnalysis completed successfully!")
@@ -2,6 +2,8 @@
 import pandas as pd
 import numpy as np
 import os
+from instrumentation import stage
+from dedup import Deduplicator
 
 def load_data(filepath):
     """加载数据"""
@@ -11,25 +13,27 @@ def load_data(filepath):
     return df
 
 def clean_data(df):
-    """数据清洗函数"""
+    """
+    数据清洗函数
+    
+    去重和异常值过滤合并为一个掩码，只复制一次数据。
+    """
     print("Cleaning data...")
-    df_clean = df.copy()
     
     # 处理重复值
-    initial_count = len(df_clean)
-    df_clean = df_clean.drop_duplicates()
-    print(f"Removed {initial_count - len(df_clean)} duplicate rows.")
+    duplicated = df.duplicated().to_numpy()
+    print(f"Removed {np.count_nonzero(duplicated)} duplicate rows.")
     
     # 处理异常值：阅读时长大于0
-    df_clean = df_clean[df_clean['read_time'] > 0]
+    df_clean = df[~duplicated & (df['read_time'].to_numpy() > 0)]
     print(f"Removed rows with non-positive read_time. Current shape: {df_clean.shape}")
     
     return df_clean
 
-def add_features(df):
-    """添加衍生特征"""
+def add_features(df, inplace=False):
+    """添加衍生特征（inplace=True 时直接在传入的数据上添加列）"""
     print("Adding features...")
-    df_enriched = df.copy()
+    df_enriched = df if inplace else df.copy()
     
     # 衍生新特征
     df_enriched['date'] = df_enriched['timestamp'].dt.date
@@ -44,25 +48,69 @@ def save_clean_data(df, filename):
     df.to_csv(filename, index=False, encoding='utf-8-sig')
     print(f"Cleaned data saved to: {filename}")
 
-if __name__ == "__main__":
-    # 加载原始数据
-    input_path = '../data/user_behavior_data.csv'
-    df_raw = load_data(input_path)
+def clean_file(input_path, output_path, chunksize=1000000, bloom_capacity=None):
+    """
+    分块清洗数据文件，内存只与分块大小和去重索引有关
+    
+    每个分块依次过滤阅读时长、跨分块去重（保留第一次出现的行）、原地添加特征，
+    再追加写入输出文件。输出与整体调用 clean_data / add_features / save_clean_data 相同。
+    
+    参数:
+    chunksize: 每个分块的行数
+    bloom_capacity: 预计的行数；给出时去重先经过布隆过滤器预检
     
-    # 数据清洗
-    df_clean = clean_data(df_raw)
+    返回:
+    统计信息字典
+    """
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    deduplicator = Deduplicator(bloom_capacity)
+    stats = {'rows_in': 0, 'non_positive_read_time': 0, 'duplicates': 0, 'rows_out': 0}
     
-    # 添加特征
-    df_enriched = add_features(df_clean)
+    reader = pd.read_csv(input_path, parse_dates=['timestamp'], chunksize=chunksize)
+    for i, chunk in enumerate(reader):
+        with stage('clean_chunk', rows=len(chunk)):
+            stats['rows_in'] += len(chunk)
+            
+            # 先过滤异常值，不进入去重索引（重复行的阅读时长相同，先后顺序不影响结果）
+            valid = chunk['read_time'].to_numpy() > 0
+            stats['non_positive_read_time'] += int(np.count_nonzero(~valid))
+            chunk = chunk[valid]
+            
+            duplicated = deduplicator.duplicated(chunk)
+            stats['duplicates'] += int(np.count_nonzero(duplicated))
+            chunk = chunk[~duplicated]
+            
+            add_features(chunk, inplace=True)
+            # 只在文件开头写入BOM和表头
+            if i == 0:
+                chunk.to_csv(output_path, index=False, encoding='utf-8-sig')
+            else:
+                chunk.to_csv(output_path, index=False, header=False, mode='a', encoding='utf-8')
+            stats['rows_out'] += len(chunk)
     
-    # 保存清洗后的数据
+    stats['index_mb'] = round(deduplicator.nbytes / 1024 / 1024, 2)
+    return stats
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Clean raw user behavior data in chunks')
+    parser.add_argument('--chunksize', type=int, default=1000000, help='Rows per chunk')
+    parser.add_argument('--bloom-capacity', type=int,
+                        help='Expected rows; enables a Bloom filter pre-check for deduplication')
+    args = parser.parse_args()
+    
+    input_path = '../data/user_behavior_data.csv'
     output_path = '../data/user_behavior_data_clean.csv'
-    save_clean_data(df_enriched, output_path)
+    print(f"Cleaning {input_path} in chunks of {args.chunksize:,} rows...")
+    with stage('clean_file') as span:
+        stats = clean_file(input_path, output_path, args.chunksize, args.bloom_capacity)
+        span.set_rows(stats['rows_in'])
     
-    # 显示清洗后的数据信息
-    print("\nCleaned Data Info:")
-    print(df_enriched.info())
-    print("\nCleaned Data Description:")
-    print(df_enriched.describe())
+    print(f"Original rows: {stats['rows_in']}")
+    print(f"Removed {stats['non_positive_read_time']} rows with non-positive read_time.")
+    print(f"Removed {stats['duplicates']} duplicate rows.")
+    print(f"Cleaned rows: {stats['rows_out']} (dedup index {stats['index_mb']} MB)")
+    print(f"Cleaned data saved to: {output_path}")
     
     print("\nData cleaning completed successfully!")
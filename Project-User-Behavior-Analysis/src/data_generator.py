@@ -3,10 +3,70 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import os
+from concurrent.futures import ProcessPoolExecutor
+from instrumentation import stage
+
+BOOK_CATEGORIES = ['都市', '玄幻', '言情', '悬疑', '科幻', '历史', '武侠']
+CATEGORY_WEIGHTS = [0.25, 0.2, 0.2, 0.15, 0.1, 0.05, 0.05]
+ACTION_TYPES = ['click', 'read', 'finish']
+ACTION_WEIGHTS = [0.6, 0.35, 0.05]
+
+# 各行为的阅读时长范围 [low, high)，read 行为的范围还取决于书籍类别
+READ_TIME_RANGES = {
+    'click': (1, 30),
+    'finish': (300, 1800)
+}
+READ_TIME_RANGES_BY_CATEGORY = {
+    '玄幻': (5, 60),
+    '科幻': (5, 60),
+    '言情': (3, 40),
+    '都市': (3, 40)
+}
+DEFAULT_READ_RANGE = (2, 30)
+
+def read_time_bounds(action_type, category):
+    """按 (行为, 类别) 用掩码填充每行阅读时长的取值范围 [low, high)"""
+    action_type = np.asarray(action_type)
+    category = np.asarray(category)
+    low = np.zeros(len(action_type), dtype=np.int64)
+    high = np.ones(len(action_type), dtype=np.int64)
+
+    for action, (lo, hi) in READ_TIME_RANGES.items():
+        mask = action_type == action
+        low[mask], high[mask] = lo, hi
+
+    is_read = action_type == 'read'
+    low[is_read], high[is_read] = DEFAULT_READ_RANGE
+    for name, (lo, hi) in READ_TIME_RANGES_BY_CATEGORY.items():
+        mask = is_read & (category == name)
+        low[mask], high[mask] = lo, hi
+
+    # 未知行为的范围为 [0, 1)，阅读时长为0
+    return low, high
+
+def read_time_table():
+    """(行为 x 类别) 的阅读时长取值范围表 (low, high)，行列顺序与 ACTION_TYPES / BOOK_CATEGORIES 一致"""
+    actions, categories = np.meshgrid(ACTION_TYPES, BOOK_CATEGORIES, indexing='ij')
+    low, high = read_time_bounds(actions.ravel(), categories.ravel())
+    return low.reshape(actions.shape), high.reshape(actions.shape)
+
+def generate_read_time(action_type, category):
+    """
+    为不同的行为生成合理的阅读时长
+
+    先按 (行为, 类别) 得到每行的取值范围，再一次性抽取。
+    按行给出上下界的 randint 与逐行调用的随机数顺序相同，结果与逐行生成一致。
+    """
+    return np.random.randint(*read_time_bounds(action_type, category))
 
 def generate_user_behavior_data():
     """
     生成模拟的用户阅读行为数据
+
+    全程使用整数编码: 用户、书籍、行为和类别都以下标抽取，阅读时长按 (行为, 类别) 查表得到取值范围，
+    打乱顺序只对编码数组做一次置换，最后直接构建分类列，不生成字符串数组、不做 merge。
+    随机数的抽取顺序与逐行实现相同，相同种子下各列取值与原实现一致
+    （字符串列以分类类型返回，写出的CSV相同）。
     """
     print("Starting data generation...")
     # 设置随机种子以保证结果可重现
@@ -18,75 +78,158 @@ def generate_user_behavior_data():
     days = 30         # 模拟30天的数据
     events_per_day = 5000 # 每天大约5000条阅读行为记录
 
-    # 生成书籍数据
-    book_categories = ['都市', '玄幻', '言情', '悬疑', '科幻', '历史', '武侠']
+    # 生成书籍数据（按下标抽取类别，与按类别名抽取的随机数相同）
     book_ids = [f'book_{i:03d}' for i in range(1, num_books+1)]
-    books_df = pd.DataFrame({
-        'book_id': book_ids,
-        'category': np.random.choice(book_categories, size=num_books, p=[0.25, 0.2, 0.2, 0.15, 0.1, 0.05, 0.05])
-    })
+    book_category_codes = np.random.choice(len(BOOK_CATEGORIES), size=num_books, p=CATEGORY_WEIGHTS)
 
     # 生成用户数据
     user_ids = [f'user_{i:04d}' for i in range(1, num_users+1)]
 
-    # 生成时间序列（过去30天） - 修复了timedelta参数类型问题
-    base_date = datetime.now() - timedelta(days=days)
-    timestamps = []
-    for i in range(days):
-        # 生成每天的随机秒数，并转换为Python整数
-        seconds_list = np.random.randint(0, 86400, size=events_per_day)
-        for j in seconds_list:
-            # 将numpy.int32转换为Python int
-            timestamp = base_date + timedelta(days=i, seconds=int(j))
-            timestamps.append(timestamp)
+    # 生成时间序列（过去30天）: 一次抽取全部秒数，用 datetime64 运算得到时间戳
+    # （与逐天抽取的随机数顺序相同）
+    base_date = np.datetime64(datetime.now() - timedelta(days=days), 'us')
+    with stage('generate_timestamps', rows=days * events_per_day):
+        seconds = np.random.randint(0, 86400, size=(days, events_per_day))
+        day_offsets = np.arange(days).astype('timedelta64[D]')[:, None]
+        timestamps = (base_date + day_offsets + seconds.astype('timedelta64[s]')).ravel()
 
     # 确保数据量一致
     num_records = len(timestamps)
 
-    # 生成行为数据
-    action_types = ['click', 'read', 'finish']
-    action_weights = [0.6, 0.35, 0.05]
-
-    data = {
-        'user_id': np.random.choice(user_ids, size=num_records),
-        'book_id': np.random.choice(book_ids, size=num_records),
-        'timestamp': timestamps,
-        'action_type': np.random.choice(action_types, size=num_records, p=action_weights),
-    }
-
-    df = pd.DataFrame(data)
-
-    # 合并书籍类别信息
-    df = df.merge(books_df, on='book_id', how='left')
+    # 生成行为数据（编码）；书籍类别由书籍编码查表得到，代替按 book_id 合并
+    user_codes = np.random.choice(num_users, size=num_records)
+    book_codes = np.random.choice(num_books, size=num_records)
+    action_codes = np.random.choice(len(ACTION_TYPES), size=num_records, p=ACTION_WEIGHTS)
+    category_codes = book_category_codes[book_codes]
 
     # 为不同的行为生成合理的阅读时长
-    def generate_read_time(action, category):
-        base_time = 0
-        if action == 'click':
-            base_time = np.random.randint(1, 30)
-        elif action == 'read':
-            if category in ['玄幻', '科幻']:
-                base_time = np.random.randint(5, 60)
-            elif category in ['言情', '都市']:
-                base_time = np.random.randint(3, 40)
-            else:
-                base_time = np.random.randint(2, 30)
-        elif action == 'finish':
-            base_time = np.random.randint(300, 1800)
-        return base_time
-
-    # 应用函数生成阅读时长
     print("Generating read time data...")
-    df['read_time'] = df.apply(lambda row: generate_read_time(row['action_type'], row['category']), axis=1)
+    with stage('generate_read_time', rows=num_records):
+        low, high = read_time_table()
+        read_time = np.random.randint(low[action_codes, category_codes], high[action_codes, category_codes])
 
-    # 调整时间戳的格式
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    # 打乱数据顺序（与 DataFrame.sample(frac=1) 使用相同的全局随机置换）
+    order = np.random.permutation(num_records)
 
-    # 打乱数据顺序
-    df = df.sample(frac=1).reset_index(drop=True)
+    df = pd.DataFrame({
+        'user_id': pd.Categorical.from_codes(user_codes[order], categories=user_ids),
+        'book_id': pd.Categorical.from_codes(book_codes[order], categories=book_ids),
+        'timestamp': timestamps[order],
+        'action_type': pd.Categorical.from_codes(action_codes[order], categories=ACTION_TYPES),
+        'category': pd.Categorical.from_codes(category_codes[order], categories=BOOK_CATEGORIES),
+        'read_time': read_time[order]
+    })
 
     return df
 
+def _used_ids(codes, prefix, width):
+    """
+    只为分区中出现过的编码生成ID，返回 (分区内编码, 类别表)
+
+    类别表只包含本分区用到的ID（保持ID顺序），分区文件和任务参数的大小与总用户数、书籍数无关。
+    """
+    used, local_codes = np.unique(codes, return_inverse=True)
+    return local_codes, [f'{prefix}_{i + 1:0{width}d}' for i in used]
+
+def _write_partition(task):
+    """
+    生成并写出一个分区（在工作进程中执行）
+
+    每个分区使用独立的随机数流，返回 (文件路径, 行数)。
+    追踪开启时工作进程的阶段事件在阶段结束时写入追踪文件。
+    """
+    with stage('write_partition', rows=task['size'], path=task['path']):
+        rng = np.random.default_rng(task['seed'])
+        size = task['size']
+        book_category_codes = task['book_category_codes']
+
+        user_codes = rng.integers(0, task['num_users'], size=size)
+        book_codes = rng.integers(0, len(book_category_codes), size=size)
+        category_codes = book_category_codes[book_codes]
+        action_codes = np.searchsorted(np.cumsum(ACTION_WEIGHTS), rng.random(size), side='right')
+        action_codes = action_codes.clip(max=len(ACTION_TYPES) - 1)
+        seconds = rng.integers(0, 86400, size=size)
+
+        # 阅读时长: 按 (行为, 类别) 查表得到取值范围
+        low, high = task['read_time_table']
+        read_time = rng.integers(low[action_codes, category_codes], high[action_codes, category_codes])
+
+        user_codes, user_ids = _used_ids(user_codes, 'user', 4)
+        book_codes, book_ids = _used_ids(book_codes, 'book', 3)
+        df = pd.DataFrame({
+            'user_id': pd.Categorical.from_codes(user_codes, categories=user_ids),
+            'book_id': pd.Categorical.from_codes(book_codes, categories=book_ids),
+            'timestamp': task['day_start'] + seconds.astype('timedelta64[s]'),
+            'action_type': pd.Categorical.from_codes(action_codes, categories=ACTION_TYPES),
+            'category': pd.Categorical.from_codes(category_codes, categories=BOOK_CATEGORIES),
+            'read_time': read_time
+        })
+
+        os.makedirs(os.path.dirname(task['path']), exist_ok=True)
+        if task['path'].endswith('.parquet'):
+            df.to_parquet(task['path'], index=False)
+        else:
+            df.to_csv(task['path'], index=False, encoding='utf-8-sig')
+        return task['path'], size
+
+def generate_partitioned_data(output_dir, num_users=1000, num_books=500, days=30, events_per_day=5000,
+                              shard_size=1000000, start_date='2024-01-01', seed=42, n_jobs=None,
+                              file_format='parquet'):
+    """
+    按天（及天内分片）并行生成用户行为数据，每个分区直接写成独立文件
+
+    分区文件为 output_dir/date=YYYY-MM-DD/part-NNNNN.<格式>，不做全局合并和打乱，
+    内存占用只与 shard_size 有关，可用于生成十亿级的容量测试数据。
+    每天的随机数流由 SeedSequence(seed) 派生，每个分片再从所在天派生，
+    因此结果只取决于 seed 和 shard_size，与进程数和天数无关（同一天的数据不随 days 改变）。
+
+    参数:
+    output_dir: 输出目录
+    num_users: 用户数
+    num_books: 书籍数
+    days: 天数
+    events_per_day: 每天的行为记录数
+    shard_size: 每个分区文件的最大行数
+    start_date: 第一天的日期
+    seed: 随机种子
+    n_jobs: 并行进程数，默认使用全部CPU核
+    file_format: 'parquet' 或 'csv'
+
+    返回:
+    [(分区文件路径, 行数), ...]，按日期和分片排序
+    """
+    if file_format not in ('parquet', 'csv'):
+        raise ValueError(f"Unsupported file format: {file_format}")
+
+    day_seeds = np.random.SeedSequence(seed).spawn(days + 1)
+    book_rng = np.random.default_rng(day_seeds[0])
+
+    # 书籍类别和阅读时长范围表在所有分区间共享
+    book_category_codes = book_rng.choice(len(BOOK_CATEGORIES), size=num_books, p=CATEGORY_WEIGHTS).astype(np.int8)
+    table = read_time_table()
+
+    first_day = np.datetime64(start_date, 'D')
+    n_shards = (events_per_day + shard_size - 1) // shard_size
+    tasks = []
+    for day in range(days):
+        day_start = first_day + np.timedelta64(day, 'D')
+        for shard, shard_seed in enumerate(day_seeds[day + 1].spawn(n_shards)):
+            tasks.append({
+                'seed': shard_seed,
+                'size': min(shard_size, events_per_day - shard * shard_size),
+                'num_users': num_users,
+                'book_category_codes': book_category_codes,
+                'read_time_table': table,
+                'day_start': day_start.astype('datetime64[ns]'),
+                'path': os.path.join(output_dir, f'date={day_start}', f'part-{shard:05d}.{file_format}')
+            })
+
+    with stage('generate_partitioned_data', rows=days * events_per_day, partitions=len(tasks)):
+        if n_jobs == 1:
+            return [_write_partition(task) for task in tasks]
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            return list(executor.map(_write_partition, tasks))
+
 def save_data(df, filename):
     """
     保存数据到CSV文件
@@ -100,8 +243,31 @@ def save_data(df, filename):
     print(f"Total records: {len(df)}")
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Generate simulated user behavior data')
+    parser.add_argument('--partitioned', metavar='DIR', help='Generate partitioned data into DIR using a process pool')
+    parser.add_argument('--users', type=int, default=1000, help='Number of users')
+    parser.add_argument('--books', type=int, default=500, help='Number of books')
+    parser.add_argument('--days', type=int, default=30, help='Number of days')
+    parser.add_argument('--events-per-day', type=int, default=5000, help='Events per day')
+    parser.add_argument('--shard-size', type=int, default=1000000, help='Maximum rows per partition file')
+    parser.add_argument('--format', default='parquet', choices=['parquet', 'csv'], help='Partition file format')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    parser.add_argument('--jobs', type=int, help='Number of worker processes (default: all cores)')
+    args = parser.parse_args()
+
+    if args.partitioned:
+        partitions = generate_partitioned_data(args.partitioned, args.users, args.books, args.days,
+                                               args.events_per_day, args.shard_size, seed=args.seed,
+                                               n_jobs=args.jobs, file_format=args.format)
+        print(f"Wrote {len(partitions)} partitions, {sum(rows for _, rows in partitions):,} records to: {args.partitioned}")
+        raise SystemExit(0)
+
     # 生成数据
-    data_df = generate_user_behavior_data()
+    with stage('generate_user_behavior_data') as span:
+        data_df = generate_user_behavior_data()
+        span.set_rows(len(data_df))
     
     # 显示数据前5行
     print("Data Sample:")
@@ -113,6 +279,7 @@ if __name__ == "__main__":
     
     # 保存数据
     output_path = '../data/user_behavior_data.csv'
-    save_data(data_df, output_path)
+    with stage('save_data', rows=len(data_df)):
+        save_data(data_df, output_path)
     
     print("\nData generation completed successfully!")
@@ -0,0 +1,195 @@
+# instrumentation.py
+import atexit
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+# 设置环境变量 PIPELINE_TRACE=<文件路径> 即可开启追踪，子进程会继承该设置；
+# PIPELINE_TRACE_MEMORY=tracemalloc 时按阶段精确统计Python内存峰值（开销较大），
+# 默认只记录进程峰值常驻内存 (ru_maxrss) 的增长。
+TRACE_ENV = 'PIPELINE_TRACE'
+MEMORY_ENV = 'PIPELINE_TRACE_MEMORY'
+
+_events = []
+_enabled = False
+_trace_path = None
+_use_tracemalloc = False
+_local = threading.local()
+_pid = os.getpid()
+
+def _max_rss_mb():
+    """当前进程的峰值常驻内存 (MB)"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == 'darwin' else rss / 1024
+
+def _check_fork():
+    """fork 出的子进程继承了父进程尚未写出的事件和阶段栈，丢弃它们（由父进程写出）"""
+    global _pid
+    if _pid != os.getpid():
+        _pid = os.getpid()
+        _events.clear()
+        _local.stack = []
+
+def enable_tracing(trace_path, memory=None, reset=False):
+    """
+    开启追踪，把事件以JSON Lines追加到 trace_path
+
+    每个顶层阶段结束时写入一次（进程池的工作进程不会执行 atexit，事件不会因此丢失），
+    进程退出时再写入剩余的事件。
+
+    参数:
+    memory: 'tracemalloc' 时按阶段统计Python内存峰值，否则只记录常驻内存
+    reset: 清空已有的事件文件（由入口进程在开始时使用）
+    """
+    global _enabled, _trace_path, _use_tracemalloc
+    if reset and os.path.exists(trace_path):
+        os.remove(trace_path)
+    if not _enabled:
+        atexit.register(flush)
+    _enabled = True
+    _trace_path = trace_path
+    _use_tracemalloc = memory == 'tracemalloc'
+    os.environ[TRACE_ENV] = trace_path
+    if memory:
+        os.environ[MEMORY_ENV] = memory
+    if _use_tracemalloc and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def is_enabled():
+    return _enabled
+
+class _NullSpan:
+    """追踪关闭时使用的空操作上下文"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set_rows(self, rows):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    """记录一个阶段的墙钟时间、CPU时间、内存和行数"""
+
+    def __init__(self, name, rows=None, **attrs):
+        self.name = name
+        self.rows = rows
+        self.attrs = attrs
+
+    def set_rows(self, rows):
+        self.rows = int(rows)
+
+    def __enter__(self):
+        _check_fork()
+        if not hasattr(_local, 'stack'):
+            _local.stack = []
+        self.depth = len(_local.stack)
+        _local.stack.append(self)
+        self.rss_before = _max_rss_mb()
+        if _use_tracemalloc:
+            self.traced_before = tracemalloc.get_traced_memory()[0]
+            self.child_peak = 0
+            tracemalloc.reset_peak()
+        self.start = time.time()
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self.wall_start
+        cpu = time.process_time() - self.cpu_start
+        _local.stack.pop()
+
+        event = {
+            'name': self.name,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'depth': self.depth,
+            'start': self.start,
+            'wall_seconds': wall,
+            'cpu_seconds': cpu,
+            'max_rss_mb': round(_max_rss_mb(), 1),
+            'rss_growth_mb': round(_max_rss_mb() - self.rss_before, 1),
+            'rows': self.rows,
+            'error': exc_type.__name__ if exc_type else None
+        }
+        if _use_tracemalloc:
+            # 子阶段会重置峰值，因此取自身峰值与子阶段峰值中的较大者，并向上传递
+            peak = max(tracemalloc.get_traced_memory()[1], self.child_peak)
+            if _local.stack:
+                parent = _local.stack[-1]
+                parent.child_peak = max(parent.child_peak, peak)
+            event['peak_traced_mb'] = round((peak - self.traced_before) / 1024 / 1024, 1)
+        event.update(self.attrs)
+        _events.append(event)
+        if not _local.stack:
+            flush()
+        return False
+
+def stage(name, rows=None, **attrs):
+    """
+    阶段计时上下文管理器；追踪关闭时几乎没有开销
+
+    用法:
+    with stage('load_data') as span:
+        df = load_data(path)
+        span.set_rows(len(df))
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, rows, **attrs)
+
+def flush():
+    """将本进程记录的事件追加写入追踪文件（一次写入，多个进程同时追加时各行不会交错）"""
+    _check_fork()
+    if not _trace_path or not _events:
+        return
+    lines = ''.join(json.dumps(event, ensure_ascii=False) + '\n' for event in _events)
+    with open(_trace_path, 'a', encoding='utf-8') as f:
+        f.write(lines)
+    _events.clear()
+
+def write_trace(output_path, chrome=False):
+    """
+    汇总所有进程的事件并写出追踪结果
+
+    参数:
+    chrome: True 时输出 Chrome trace 格式（可在 chrome://tracing 或 Perfetto 中查看），
+            否则输出事件列表JSON
+    """
+    flush()
+    events = []
+    if _trace_path and os.path.exists(_trace_path):
+        with open(_trace_path, 'r', encoding='utf-8') as f:
+            events = [json.loads(line) for line in f if line.strip()]
+    events.sort(key=lambda event: event['start'])
+
+    if chrome:
+        origin = min((event['start'] for event in events), default=0)
+        trace = {'traceEvents': [{
+            'name': event['name'],
+            'ph': 'X',
+            'ts': (event['start'] - origin) * 1e6,
+            'dur': event['wall_seconds'] * 1e6,
+            'pid': event['pid'],
+            'tid': event['tid'],
+            'args': {k: v for k, v in event.items() if k not in ('name', 'pid', 'tid', 'start', 'wall_seconds')}
+        } for event in events]}
+    else:
+        trace = events
+
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(trace, f, indent=2, ensure_ascii=False)
+    return trace
+
+# 由父进程开启追踪时，子进程自动开启
+if os.environ.get(TRACE_ENV):
+    enable_tracing(os.environ[TRACE_ENV], os.environ.get(MEMORY_ENV))
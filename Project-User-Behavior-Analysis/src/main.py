@@ -1,34 +1,131 @@
 # main.py
-import subprocess
-import sys
 import os
+import argparse
+import pandas as pd
+from instrumentation import enable_tracing, write_trace, stage
+from data_generator import generate_user_behavior_data, save_data
+from data_cleaner import clean_data, add_features, save_clean_data
+from analyzer import ensure_figures_dir, run_analysis
+from aggregation import CATEGORICAL_COLUMNS
 
-def run_script(script_name):
-    """运行指定的Python脚本"""
-    print(f"\n{'='*50}")
-    print(f"Running {script_name}")
-    print(f"{'='*50}")
-    
-    try:
-        # 使用当前Python解释器运行脚本
-        result = subprocess.run([sys.executable, script_name], check=True, cwd=os.path.dirname(__file__))
-        print(f"{script_name} completed successfully!")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"Error running {script_name}: {e}")
-        return False
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+RAW_CSV = '../data/user_behavior_data.csv'
+CLEAN_CSV = '../data/user_behavior_data_clean.csv'
+STAGES = ['generate', 'clean', 'analyze']
+
+def to_categorical(df):
+    """
+    把分析用到的字符串列转换为分类类型（与 analyzer.load_clean_data 读入CSV的结果一致）
+
+    日期只对类别表做字符串转换，代价与天数而不是行数成正比。
+    """
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            values = pd.Categorical(df[column])
+            if column == 'date':
+                values = values.rename_categories(lambda date: str(date))
+            df[column] = values
+    return df
+
+def checkpoint_path(checkpoint_dir, stage_name):
+    return os.path.join(checkpoint_dir, f'{stage_name}.parquet')
+
+def save_checkpoint(df, checkpoint_dir, stage_name):
+    """
+    把阶段输出写成二进制检查点，用于中断后恢复
+
+    后续阶段的旧检查点由上一轮数据产生，先删除它们，
+    避免恢复时跳过新数据而读到过期的结果。
+    """
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    for later in STAGES[STAGES.index(stage_name) + 1:]:
+        stale = checkpoint_path(checkpoint_dir, later)
+        if os.path.exists(stale):
+            os.remove(stale)
+    path = checkpoint_path(checkpoint_dir, stage_name)
+    with stage(f'checkpoint_{stage_name}', rows=len(df)):
+        df.to_parquet(path + '.tmp', index=False)
+        os.replace(path + '.tmp', path)
+
+def latest_checkpoint(checkpoint_dir):
+    """最后一个已完成阶段的检查点 (阶段名, 路径)，没有时返回 (None, None)"""
+    for stage_name in reversed(STAGES[:-1]):
+        path = checkpoint_path(checkpoint_dir, stage_name)
+        if os.path.exists(path):
+            return stage_name, path
+    return None, None
+
+def run_pipeline(checkpoint_dir=None, resume=False, export_csv=False):
+    """
+    在同一进程中依次执行数据生成、清洗和分析，阶段之间直接传递 DataFrame
+
+    参数:
+    checkpoint_dir: 给出时把生成和清洗的结果写成 parquet 检查点
+    resume: 从 checkpoint_dir 中最后一个已完成阶段的检查点继续
+    export_csv: 同时写出原始数据和清洗后数据的CSV文件
+
+    返回:
+    各项分析结果
+    """
+    completed, path = latest_checkpoint(checkpoint_dir) if resume and checkpoint_dir else (None, None)
+    if completed:
+        print(f"Resuming after '{completed}' from checkpoint: {path}")
+        with stage('load_checkpoint') as span:
+            df = pd.read_parquet(path)
+            span.set_rows(len(df))
+
+    if completed is None:
+        with stage('generate_user_behavior_data') as span:
+            df = generate_user_behavior_data()
+            span.set_rows(len(df))
+        if export_csv:
+            with stage('save_data', rows=len(df)):
+                save_data(df, RAW_CSV)
+        if checkpoint_dir:
+            save_checkpoint(df, checkpoint_dir, 'generate')
+
+    if completed in (None, 'generate'):
+        with stage('clean_data', rows=len(df)):
+            df = clean_data(df)
+        with stage('add_features', rows=len(df)):
+            df = add_features(df, inplace=True)
+        if export_csv:
+            with stage('save_clean_data', rows=len(df)):
+                save_clean_data(df, CLEAN_CSV)
+        with stage('to_categorical', rows=len(df)):
+            df = to_categorical(df)
+        if checkpoint_dir:
+            save_checkpoint(df, checkpoint_dir, 'clean')
+
+    return run_analysis(df, ensure_figures_dir())
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='User behavior analysis pipeline')
+    parser.add_argument('--trace', metavar='PATH', help='Write a JSON trace of stage timings and memory')
+    parser.add_argument('--chrome-trace', action='store_true', help='Use Chrome trace format for --trace')
+    parser.add_argument('--checkpoint-dir', metavar='DIR', help='Write parquet checkpoints after generation and cleaning')
+    parser.add_argument('--resume', action='store_true', help='Resume from the latest checkpoint in --checkpoint-dir')
+    parser.add_argument('--csv', action='store_true', help='Also export the raw and cleaned data as CSV files')
+    args = parser.parse_args()
+    if args.resume and not args.checkpoint_dir:
+        parser.error('--resume requires --checkpoint-dir')
+
+    # 相对路径（../data/...）以 src 目录为基准
+    trace_path = os.path.abspath(args.trace) if args.trace else None
+    checkpoint_dir = os.path.abspath(args.checkpoint_dir) if args.checkpoint_dir else None
+    os.chdir(SRC_DIR)
+
+    if trace_path:
+        enable_tracing(trace_path + '.events.jsonl', reset=True)
+
     print("Starting Project 1: User Behavior Analysis")
-    
-    # 按顺序运行所有脚本
-    scripts = ['data_generator.py', 'data_cleaner.py', 'analyzer.py']
-    
-    for script in scripts:
-        if not run_script(script):
-            print(f"Stopping due to error in {script}")
-            break
-    else:
-        print("\n" + "="*50)
-        print("All steps completed successfully!")
-        print("="*50)
+    run_pipeline(checkpoint_dir, args.resume, args.csv)
+
+    print("\n" + "="*50)
+    print("All steps completed successfully!")
+    print("="*50)
+
+    if trace_path:
+        write_trace(trace_path, chrome=args.chrome_trace)
+        os.remove(trace_path + '.events.jsonl')
+        print(f"Trace saved to: {args.trace}")
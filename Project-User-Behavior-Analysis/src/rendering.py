@@ -0,0 +1,110 @@
+# rendering.py
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+import matplotlib.pyplot as plt
+
+CACHE_FILE = '.render_cache.json'
+
+def figure_spec(func, args, path, **kwargs):
+    """
+    描述一张图表: 绘图函数、已汇总好的数据和输出路径
+
+    func 必须是模块级函数，以 func(*args, save_path=path, **kwargs) 调用，
+    这样图表可以在子进程中渲染，也可以根据数据哈希判断是否需要重新渲染。
+    args 应是汇总后的小数据（计数、序列等），而不是明细数据。
+    """
+    return {'func': func, 'args': tuple(args), 'path': path, 'kwargs': kwargs}
+
+def _module_name(func):
+    """绘图函数所在模块名；作为脚本运行的模块（__main__）按文件名计，与被导入时一致"""
+    module = func.__module__
+    if module == '__main__':
+        main_file = getattr(sys.modules['__main__'], '__file__', None)
+        if main_file:
+            module = os.path.splitext(os.path.basename(main_file))[0]
+    return module
+
+def _code_fingerprint(func):
+    """
+    绘图代码的哈希
+
+    使用绘图函数所在模块的完整源码，修改绘图函数或同模块中的辅助函数（样式、保存等）都会使缓存失效；
+    取不到源码时退回到函数的字节码和常量。
+    """
+    try:
+        source = inspect.getsource(inspect.getmodule(func)).encode('utf-8')
+    except (OSError, TypeError):
+        code = func.__code__
+        source = code.co_code + repr(code.co_consts).encode('utf-8')
+    return hashlib.sha256(source).hexdigest()
+
+def spec_hash(spec):
+    """图表的内容哈希（绘图代码、数据、参数和输出路径）"""
+    func = spec['func']
+    payload = pickle.dumps(
+        (_module_name(func), func.__qualname__, _code_fingerprint(func),
+         spec['args'], sorted(spec['kwargs'].items()), spec['path']),
+        protocol=4
+    )
+    return hashlib.sha256(payload).hexdigest()
+
+def _render(spec):
+    """渲染单张图表（可在子进程中执行）"""
+    matplotlib.use('Agg')  # 非交互式后端，批量运行时不会阻塞
+    spec['func'](*spec['args'], save_path=spec['path'], **spec['kwargs'])
+    plt.close('all')
+    return spec['path']
+
+def _load_cache(cache_path):
+    if os.path.exists(cache_path):
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+def render_figures(specs, cache_dir, n_jobs=None, force=False):
+    """
+    渲染一组图表，跳过数据未变化且文件已存在的图表
+
+    参数:
+    specs: figure_spec 的列表
+    cache_dir: 保存渲染缓存（各图表内容哈希）的目录
+    n_jobs: 并行进程数，默认使用全部CPU核；只有一张待渲染时直接在当前进程渲染
+    force: 忽略缓存全部重新渲染
+
+    返回:
+    {'rendered': [...], 'skipped': [...]} 两个路径列表
+    """
+    cache_path = os.path.join(cache_dir, CACHE_FILE)
+    cache = _load_cache(cache_path)
+
+    stale = []
+    skipped = []
+    for spec in specs:
+        digest = spec_hash(spec)
+        if not force and cache.get(spec['path']) == digest and os.path.exists(spec['path']):
+            skipped.append(spec['path'])
+        else:
+            stale.append((spec, digest))
+
+    if len(stale) > 1 and n_jobs != 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            rendered = list(executor.map(_render, [spec for spec, _ in stale]))
+    else:
+        rendered = [_render(spec) for spec, _ in stale]
+
+    # 全部渲染成功后才更新缓存
+    for spec, digest in stale:
+        cache[spec['path']] = digest
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(cache_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, indent=2, ensure_ascii=False)
+
+    return {'rendered': rendered, 'skipped': skipped}
@@ -0,0 +1,182 @@
+# rollups.py
+import json
+import os
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from aggregation import EventAggregates, encode, count_distinct
+from dedup import hash_schema
+
+# 汇总依赖的明细列，指纹由这些列计算
+ROLLUP_COLUMNS = ['user_id', 'book_id', 'category', 'action_type', 'read_time', 'hour']
+
+def _as_categorical(column):
+    """Arrow 字符串列 -> pandas 分类列（字典编码在Arrow中完成）"""
+    encoded = column.combine_chunks().dictionary_encode()
+    categories = encoded.dictionary.to_pandas()
+    return pd.Series(pd.Categorical.from_codes(encoded.indices.to_numpy(), categories=categories))
+
+def content_fingerprint(df):
+    """
+    明细数据的内容指纹: 行数和各行哈希之和（与行的顺序和列类型无关）
+
+    同一日期的明细数据发生变化（补数、重新生成等）时指纹不同，用于判断已有汇总是否过期。
+    """
+    return _fingerprint(_row_hashes(df))
+
+def _row_hashes(df):
+    return pd.util.hash_pandas_object(hash_schema(df[ROLLUP_COLUMNS]), index=False).to_numpy()
+
+def _fingerprint(hashes):
+    return f'{len(hashes)}:{int(hashes.sum(dtype=np.uint64)):016x}'
+
+def daily_rollup(day_df):
+    """
+    计算一天数据的汇总
+
+    返回:
+    (summary, user_books)
+    summary: 可JSON序列化的字典，包含事件数、活跃用户数、每小时事件数、各类别事件数和阅读时长、各行为事件数
+             以及明细数据的内容指纹
+    user_books: 每个 (用户, 书籍) 的事件数和阅读时长，是可跨天合并的用户级中间结果
+    """
+    read_time = day_df['read_time'].to_numpy(dtype=np.int64)
+
+    category_codes, categories = encode(day_df['category'])
+    action_codes, actions = encode(day_df['action_type'])
+    category_counts = np.bincount(category_codes, minlength=len(categories))
+    category_read_time = np.bincount(category_codes, weights=read_time, minlength=len(categories))
+
+    user_codes, users = encode(day_df['user_id'])
+    book_codes, books = encode(day_df['book_id'])
+    pair_codes, pairs = pd.factorize(user_codes.astype(np.int64) * len(books) + book_codes)
+    user_books = pd.DataFrame({
+        'user_id': np.asarray(users)[pairs // len(books)],
+        'book_id': np.asarray(books)[pairs % len(books)],
+        'events': np.bincount(pair_codes, minlength=len(pairs)),
+        'read_time': np.bincount(pair_codes, weights=read_time, minlength=len(pairs)).astype(np.int64)
+    })
+
+    action_counts = np.bincount(action_codes, minlength=len(actions))
+    summary = {
+        'fingerprint': content_fingerprint(day_df),
+        'n_events': len(day_df),
+        'active_users': int(np.count_nonzero(np.bincount(user_codes, minlength=len(users)))),
+        'hourly': np.bincount(day_df['hour'].to_numpy(), minlength=24).tolist(),
+        'categories': {str(name): [int(count), int(total)]
+                       for name, count, total in zip(categories, category_counts, category_read_time) if count},
+        'actions': {str(name): int(count) for name, count in zip(actions, action_counts) if count}
+    }
+    return summary, user_books
+
+class RollupStore:
+    """
+    按日期物化的汇总存储
+
+    每天对应 <日期>.json（汇总计数）和 <日期>.parquet（用户-书籍级中间结果）两个文件。
+    新增一天的数据只写该日期的文件；报告所需的全部聚合由各天的汇总合并得到，无需重新扫描明细数据。
+    已有日期的明细数据内容变化时（指纹不同）重新计算该日期的汇总。
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, date, ext):
+        return os.path.join(self.directory, f'{date}.{ext}')
+
+    def dates(self):
+        """已有汇总的日期（json 文件最后写入，存在即表示该日期汇总完整）"""
+        return sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith('.json'))
+
+    def ingest(self, df, overwrite=False):
+        """
+        写入明细数据中各日期的汇总
+
+        已有汇总的日期只在明细数据的内容指纹与保存的指纹不同时重新计算
+        （例如上次只包含当天的部分数据）。
+
+        参数:
+        df: 清洗后的行为数据（缺少 date / hour 时由 timestamp 推导）
+        overwrite: 是否无条件重新计算已有的日期
+
+        返回:
+        本次写入（新增或重新计算）的日期列表
+        """
+        dates = df['date'] if 'date' in df.columns else df['timestamp'].dt.date
+        hours = df['hour'] if 'hour' in df.columns else df['timestamp'].dt.hour
+        dates = dates.astype(str)
+        existing = set() if overwrite else set(self.dates())
+        # 全部行的哈希只计算一次，再按日期求和得到各日期的指纹
+        hashes = _row_hashes(df.assign(hour=hours.to_numpy())) if existing else None
+
+        written = []
+        for date, index in df.groupby(dates, observed=True).indices.items():
+            if date in existing:
+                saved = self.load_summaries([date])[date].get('fingerprint')
+                if saved == _fingerprint(hashes[index]):
+                    continue
+            day_df = df.iloc[index].assign(hour=hours.iloc[index].to_numpy())
+            summary, user_books = daily_rollup(day_df)
+            user_books.to_parquet(self._path(date, 'parquet'), index=False)
+            with open(self._path(date, 'json'), 'w', encoding='utf-8') as f:
+                json.dump(summary, f, ensure_ascii=False)
+            written.append(date)
+        return written
+
+    def load_summaries(self, dates=None):
+        summaries = {}
+        for date in dates or self.dates():
+            with open(self._path(date, 'json'), 'r', encoding='utf-8') as f:
+                summaries[date] = json.load(f)
+        return summaries
+
+    def assemble(self, dates=None):
+        """
+        由各天的汇总组装 EventAggregates（默认使用全部日期）
+
+        结果与对这些日期的明细数据调用 aggregate_events 相同。
+        """
+        summaries = self.load_summaries(dates)
+        dates = list(summaries)
+
+        hourly = np.sum([summary['hourly'] for summary in summaries.values()], axis=0)
+        present_hours = np.flatnonzero(hourly)
+
+        categories = {}
+        actions = {}
+        for summary in summaries.values():
+            for name, (count, total) in summary['categories'].items():
+                merged = categories.setdefault(name, [0, 0])
+                merged[0] += count
+                merged[1] += total
+            for name, count in summary['actions'].items():
+                actions[name] = actions.get(name, 0) + count
+        category_index = pd.Index(sorted(categories), name='category')
+        action_index = pd.Index(sorted(actions), name='action_type')
+
+        # 用户级中间结果跨天合并: 事件数和阅读时长相加，阅读书籍数为 (用户, 书籍) 去重后的个数
+        # 一次读取全部日期的文件，在Arrow中完成字典编码
+        user_books = pq.read_table([self._path(date, 'parquet') for date in dates])
+        user_codes, users = encode(_as_categorical(user_books.column('user_id')))
+        book_codes, books = encode(_as_categorical(user_books.column('book_id')))
+        events = user_books.column('events').to_numpy()
+        read_time = user_books.column('read_time').to_numpy()
+        user_stats = pd.DataFrame({
+            'total_events': np.bincount(user_codes, weights=events, minlength=len(users)).astype(np.int64),
+            'total_read_time': np.bincount(user_codes, weights=read_time, minlength=len(users)).astype(np.int64),
+            'unique_books': count_distinct(user_codes, len(users), book_codes, len(books))
+        }, index=pd.Index(users, name='user_id'))
+
+        return EventAggregates(
+            n_events=sum(summary['n_events'] for summary in summaries.values()),
+            dau=pd.Series([summaries[date]['active_users'] for date in dates],
+                          index=pd.Index(dates, name='date'), name='user_id'),
+            hourly_activity=pd.Series(hourly[present_hours], index=pd.Index(present_hours, name='hour')),
+            category_counts=pd.Series([categories[name][0] for name in category_index],
+                                      index=category_index, name='count'),
+            category_read_time_sum=pd.Series([float(categories[name][1]) for name in category_index],
+                                             index=category_index, name='read_time'),
+            action_counts=pd.Series([actions[name] for name in action_index], index=action_index, name='count'),
+            user_stats=user_stats
+        )
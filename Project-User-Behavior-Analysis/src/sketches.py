@@ -0,0 +1,167 @@
+# sketches.py
+import os
+import math
+import numpy as np
+import pandas as pd
+
+# HyperLogLog 的相对标准误差约为 1.04 / sqrt(2^precision)
+MIN_PRECISION = 4
+MAX_PRECISION = 18
+
+# 寄存器数较少时偏差修正常数 alpha 使用标准取值，更多寄存器时使用近似公式
+SMALL_ALPHA = {16: 0.673, 32: 0.697, 64: 0.709}
+
+def precision_for_error(error, max_precision=MAX_PRECISION):
+    """满足给定相对标准误差所需的最小精度（寄存器数为 2^precision，不超过 2^max_precision）"""
+    precision = math.ceil(2 * math.log2(1.04 / error))
+    return min(max(precision, MIN_PRECISION), max_precision)
+
+def hash_values(values):
+    """
+    稳定的64位哈希（跨进程、跨运行一致）
+
+    分类列只对类别表做哈希再按编码取值，代价与类别数而不是行数成正比。
+    """
+    values = pd.Series(values) if not isinstance(values, pd.Series) else values
+    return pd.util.hash_pandas_object(values, index=False).to_numpy()
+
+def _bit_length(x):
+    """uint64 数组的二进制位数（按高低32位分别计算，避免浮点舍入）"""
+    high = (x >> np.uint64(32)).astype(np.float64)
+    low = (x & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(high > 0, 32 + np.frexp(high)[1], np.frexp(low)[1])
+
+def register_updates(hashes, precision):
+    """由哈希值得到 (寄存器下标, 秩)，秩为剩余位中前导零个数加一"""
+    width = 64 - precision
+    index = (hashes >> np.uint64(width)).astype(np.int64)
+    rest = hashes & np.uint64((1 << width) - 1)
+    rank = (width - _bit_length(rest) + 1).astype(np.uint8)
+    return index, rank
+
+def estimate(registers):
+    """
+    由寄存器估计基数（registers 的最后一维为寄存器，可以一次估计多个草图）
+
+    小基数时使用线性计数修正。
+    """
+    registers = np.asarray(registers)
+    m = registers.shape[-1]
+    alpha = SMALL_ALPHA.get(m, 0.7213 / (1 + 1.079 / m))
+    raw = alpha * m * m / np.sum(np.ldexp(1.0, -registers.astype(np.int64)), axis=-1)
+    zeros = np.count_nonzero(registers == 0, axis=-1)
+    with np.errstate(divide='ignore'):
+        linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)
+
+def grouped_registers(group_codes, n_groups, hashes, precision):
+    """
+    一次扫描为每个分组构建一个草图，返回形状为 (n_groups, 2^precision) 的寄存器矩阵
+
+    矩阵是稠密的（每个分组 2^precision 字节），分组很多时（如按用户分组）应使用较低的精度。
+    """
+    registers = np.zeros((n_groups, 1 << precision), dtype=np.uint8)
+    index, rank = register_updates(hashes, precision)
+    np.maximum.at(registers, (group_codes, index), rank)
+    return registers
+
+class HyperLogLog:
+    """
+    可合并的 HyperLogLog 去重计数草图
+
+    参数:
+    precision: 精度，寄存器数为 2^precision
+    error: 目标相对标准误差（给出时按误差计算精度）
+    """
+
+    def __init__(self, precision=14, error=None, registers=None):
+        self.precision = precision_for_error(error) if error is not None else precision
+        if registers is None:
+            registers = np.zeros(1 << self.precision, dtype=np.uint8)
+        self.registers = registers
+
+    @property
+    def relative_error(self):
+        return 1.04 / math.sqrt(1 << self.precision)
+
+    def add(self, values):
+        """批量加入取值"""
+        index, rank = register_updates(hash_values(values), self.precision)
+        np.maximum.at(self.registers, index, rank)
+        return self
+
+    def merge(self, other):
+        """就地并入另一个同精度的草图"""
+        if other.precision != self.precision:
+            raise ValueError(f"Cannot merge sketches with precision {self.precision} and {other.precision}")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        return float(estimate(self.registers))
+
+    def copy(self):
+        return HyperLogLog(self.precision, registers=self.registers.copy())
+
+class DailySketches:
+    """
+    按天保存的活跃用户草图
+
+    每天一个 HyperLogLog，可以持久化后与新的日期合并；
+    任意日期范围的活跃用户数（WAU / MAU 等）由对应草图的并集得到，无需重新扫描明细数据。
+    """
+
+    def __init__(self, precision, sketches=None):
+        self.precision = precision
+        self.sketches = dict(sketches or {})
+
+    @classmethod
+    def from_registers(cls, dates, registers, precision):
+        return cls(precision, {str(date): HyperLogLog(precision, registers=row) for date, row in zip(dates, registers)})
+
+    def update(self, other):
+        """合并另一组日草图（同一天的草图取并集）"""
+        for date, sketch in other.sketches.items():
+            if date in self.sketches:
+                self.sketches[date].merge(sketch)
+            else:
+                self.sketches[date] = sketch.copy()
+        return self
+
+    def dates(self):
+        return sorted(self.sketches)
+
+    def daily_counts(self):
+        """每日活跃用户数估计"""
+        dates = self.dates()
+        registers = np.stack([self.sketches[date].registers for date in dates])
+        return pd.Series(estimate(registers), index=pd.Index(dates, name='date'), name='user_id')
+
+    def union_count(self, dates):
+        """多个日期的去重用户数估计"""
+        registers = np.max(np.stack([self.sketches[date].registers for date in dates]), axis=0)
+        return float(estimate(registers))
+
+    def rolling_counts(self, window):
+        """以每天为终点、最近 window 天的去重用户数（window=7 为WAU，30 为MAU）"""
+        dates = self.dates()
+        return pd.Series([self.union_count(dates[max(0, i - window + 1):i + 1]) for i in range(len(dates))],
+                         index=pd.Index(dates, name='date'), name=f'active_users_{window}d')
+
+    def save(self, directory):
+        """每天写一个文件 <日期>.npy，已有文件会被覆盖"""
+        os.makedirs(directory, exist_ok=True)
+        for date, sketch in self.sketches.items():
+            np.save(os.path.join(directory, f'{date}.npy'), sketch.registers)
+
+    @classmethod
+    def load(cls, directory):
+        sketches = {}
+        for name in sorted(os.listdir(directory)):
+            if name.endswith('.npy'):
+                registers = np.load(os.path.join(directory, name))
+                sketches[name[:-4]] = HyperLogLog(int(math.log2(len(registers))), registers=registers)
+        precisions = {sketch.precision for sketch in sketches.values()}
+        if len(precisions) > 1:
+            raise ValueError(f"Sketches in {directory} have mixed precisions: {sorted(precisions)}")
+        return cls(precisions.pop() if precisions else 14, sketches)